@@ -6,4 +6,6 @@ Licence: AGPL v3
 """
 
 from .base_data_prep import *
+from .batch_builder import *
 from .next_activity import *
+from .next_activity_sequence import *
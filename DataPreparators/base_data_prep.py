@@ -40,6 +40,26 @@ class DataPreparator:
         self.orchestrator = orchestrator
         self.input_decoders = create_all_decoders(orchestrator)
 
+    def get_index_columns(self):
+        """
+        Returns the encoded columns storing indexes of qualitative values (built by "OneHotIndex" encoders), that must
+        be expanded into "one-hot" vectors before reaching the neural network
+
+        :return: List of (index of the column, number of values)
+        :rtype: list
+        """
+        return [(encoder.column_ids[0], len(encoder.unique_values)) for encoder in self.input_decoders.encoders
+                if encoder.name == "OneHotIndex"]
+
+    def get_sequence_length(self):
+        """
+        Returns the number of events of the inputs of the neural network
+
+        :return: Length of the inputs, or None if it varies from one batch to another
+        :rtype: int
+        """
+        return self.orchestrator.max_case_length - 1
+
     def run_online(self, get_leftovers=False):
         """
         Separates the encoded data into inputs and outputs (online mode)
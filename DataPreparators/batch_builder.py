@@ -0,0 +1,183 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import numpy as np
+
+
+class BatchBuilder:
+
+    def __init__(self, batch_size, sequence_length, features_counter, target_counter, buffer_counter=3,
+                 weighted=False) -> None:
+        """
+        Builds batches of padded prefixes and their "one-hot" targets inside preallocated float32 buffers, without
+        creating one array per prefix. The prefixes are copied from the encoded events with a single vectorized gather
+        per call of add.
+
+        The arrays returned by get_batch are views of the buffers, that are reused: a batch is overwritten once
+        buffer_counter other batches have been built. This leaves enough time for consumers reading a few batches in
+        advance (Keras peeks at the first batches of a generator)
+
+        :param batch_size: Maximum number of prefixes inside a batch
+        :type batch_size: int
+        :param sequence_length: Length of the padded prefixes (longer prefixes keep their last events)
+        :type sequence_length: int
+        :param features_counter: Number of encoded columns of an event
+        :type features_counter: int
+        :param target_counter: Number of possible targets (size of a "one-hot" target)
+        :type target_counter: int
+        :param buffer_counter: Number of buffers used in turn
+        :type buffer_counter: int
+        :param weighted: Defines if every prefix has a weight, returned with the batch
+        :type weighted: bool
+        """
+        self.batch_size = batch_size
+        self.sequence_length = sequence_length
+        self.input_buffers = np.zeros((buffer_counter, batch_size, sequence_length, features_counter), dtype=np.float32)
+        self.target_buffers = np.zeros((buffer_counter, batch_size, target_counter), dtype=np.float32)
+        self.weight_buffers = np.zeros((buffer_counter, batch_size), dtype=np.float32) if weighted else None
+        self.time_steps = np.arange(sequence_length)
+        self.buffer_id = 0
+        self.counter = 0
+
+    def get_free_space(self):
+        """
+        Returns the number of prefixes that can still be added to the current batch
+
+        :return: Number of free rows
+        :rtype: int
+        """
+        return self.batch_size - self.counter
+
+    def is_full(self):
+        return self.counter == self.batch_size
+
+    def add(self, values, starts, ends, target_ids, weights=None):
+        """
+        Adds prefixes to the current batch, as long as it is not full. A prefix is made of the events starts[i] to
+        ends[i] - 1 of values
+
+        :param values: Encoded events, one per row (for example, a case or all the cases of an encoded store)
+        :type values: np.ndarray
+        :param starts: Index of the first event of every prefix
+        :type starts: np.ndarray
+        :param ends: Index after the last event of every prefix
+        :type ends: np.ndarray
+        :param target_ids: Index of the target of every prefix
+        :type target_ids: np.ndarray
+        :param weights: Weight of every prefix (only used if the builder is weighted)
+        :type weights: np.ndarray
+        :return: Number of prefixes added (the first ones)
+        :rtype: int
+        """
+        added = min(len(ends), self.get_free_space())
+        ends = np.asarray(ends[:added], dtype=np.int64)
+        starts = np.maximum(np.asarray(starts[:added], dtype=np.int64), ends - self.sequence_length)
+        inputs = self.input_buffers[self.buffer_id, self.counter:self.counter + added]
+        targets = self.target_buffers[self.buffer_id, self.counter:self.counter + added]
+        # Prefixes are padded at the end: the time step t of a prefix is its event starts + t, if it exists
+        positions = starts[:, None] + self.time_steps
+        is_event = positions < ends[:, None]
+        inputs[...] = 0
+        inputs[is_event] = values[positions[is_event]]
+        targets[...] = 0
+        targets[np.arange(added), target_ids[:added]] = 1
+        if self.weight_buffers is not None:
+            self.weight_buffers[self.buffer_id, self.counter:self.counter + added] = 1 if weights is None else \
+                weights[:added]
+        self.counter += added
+        return added
+
+    def get_batch(self):
+        """
+        Returns the current batch, and starts a new one inside the next buffer
+
+        :return: Padded prefixes and their targets (and their weights, if the builder is weighted)
+        :rtype: tuple
+        """
+        batch = (self.input_buffers[self.buffer_id, :self.counter], self.target_buffers[self.buffer_id, :self.counter])
+        if self.weight_buffers is not None:
+            batch += (self.weight_buffers[self.buffer_id, :self.counter],)
+        self.buffer_id = (self.buffer_id + 1) % len(self.input_buffers)
+        self.counter = 0
+        return batch
+
+
+class SequenceBatchBuilder(BatchBuilder):
+
+    def __init__(self, batch_size, sequence_length, features_counter, target_counter, get_target_ids,
+                 buffer_counter=3) -> None:
+        """
+        Builds batches of padded cases, with a target for every event: the activity of the following event. A weight is
+        given to every time step: 1 if it has a target, 0 for padding
+
+        :param batch_size: Maximum number of cases inside a batch
+        :type batch_size: int
+        :param sequence_length: Length of the padded cases
+        :type sequence_length: int
+        :param features_counter: Number of encoded columns of an event
+        :type features_counter: int
+        :param target_counter: Number of possible targets (size of a "one-hot" target)
+        :type target_counter: int
+        :param get_target_ids: Function returning the index of the target of encoded events
+        :type get_target_ids: function
+        :param buffer_counter: Number of buffers used in turn
+        :type buffer_counter: int
+        """
+        super().__init__(batch_size, sequence_length, features_counter, target_counter, buffer_counter)
+        self.target_buffers = np.zeros((buffer_counter, batch_size, sequence_length, target_counter), dtype=np.float32)
+        self.weight_buffers = np.zeros((buffer_counter, batch_size, sequence_length), dtype=np.float32)
+        self.get_target_ids = get_target_ids
+
+    def add(self, values, starts, ends, target_ids=None, weights=None):
+        """
+        Adds cases to the current batch, as long as it is not full. The inputs of a case are the events starts[i] to
+        ends[i] - 1 of values, and their targets the events starts[i] + 1 to ends[i]
+
+        :param values: Encoded events, one per row (for example, a case or all the cases of an encoded store)
+        :type values: np.ndarray
+        :param starts: Index of the first event of every case
+        :type starts: np.ndarray
+        :param ends: Index of the last event of every case
+        :type ends: np.ndarray
+        :param target_ids: Not used, as the targets are read from the events
+        :type target_ids: np.ndarray
+        :param weights: Not used, as the weights are given to the time steps
+        :type weights: np.ndarray
+        :return: Number of cases added (the first ones)
+        :rtype: int
+        """
+        added = min(len(ends), self.get_free_space())
+        ends = np.asarray(ends[:added], dtype=np.int64)
+        starts = np.maximum(np.asarray(starts[:added], dtype=np.int64), ends - self.sequence_length)
+        inputs = self.input_buffers[self.buffer_id, self.counter:self.counter + added]
+        targets = self.target_buffers[self.buffer_id, self.counter:self.counter + added]
+        weights = self.weight_buffers[self.buffer_id, self.counter:self.counter + added]
+        positions = starts[:, None] + self.time_steps
+        is_event = positions < ends[:, None]
+        event_positions = positions[is_event]
+        inputs[...] = 0
+        inputs[is_event] = values[event_positions]
+        targets[...] = 0
+        # The target of a time step is the activity of the following event
+        sample_ids, time_steps = np.nonzero(is_event)
+        targets[sample_ids, time_steps, self.get_target_ids(values[event_positions + 1])] = 1
+        weights[...] = is_event
+        self.counter += added
+        return added
+
+    def get_batch(self):
+        """
+        Returns the current batch, and starts a new one inside the next buffer
+
+        :return: Padded cases, their targets and the weights of their time steps
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        """
+        batch = (self.input_buffers[self.buffer_id, :self.counter], self.target_buffers[self.buffer_id, :self.counter],
+                 self.weight_buffers[self.buffer_id, :self.counter])
+        self.buffer_id = (self.buffer_id + 1) % len(self.input_buffers)
+        self.counter = 0
+        return batch
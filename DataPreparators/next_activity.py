@@ -4,7 +4,10 @@ Version 1.5
 Authors: Benoit Vuillemin, Frederic Bertrand
 Licence: AGPL v3
 """
+import glob
+import os
 import random
+from math import ceil
 
 import numpy as np
 import pandas as pd
@@ -12,15 +15,41 @@ import tensorflow as tf
 from tqdm import tqdm
 
 from DataPreparators.base_data_prep import *
+from DataPreparators.batch_builder import BatchBuilder
+from Managers.encoded_store import EncodedStore
 from Managers.encoder_manager import EncoderManager
-from generic_functions import get_total_chunk_number
 
 
 class NextActivity(DataPreparator):
-    def __init__(self):
+    def __init__(self, bucket_bounds=None, dataset_cache=None, deduplicate=False):
+        """
+        Initializes the NextActivity object
+
+        :param bucket_bounds: Maximum lengths of prefixes of the buckets, used to group prefixes of similar lengths
+        inside the same batches: each batch is only padded to the bound of its bucket. The last bucket always ends at
+        the maximum length of a prefix. By default, there is a single bucket
+        :type bucket_bounds: list
+        :param dataset_cache: Cache of the batches of the offline datasets, after the first epoch: "" to keep them in
+        memory, or the prefix of the paths of local files. By default, the batches are built again at every epoch
+        :type dataset_cache: str
+        :param deduplicate: Defines if identical (prefix, next activity) pairs of a set are read only once offline, with
+        their number of occurrences as weight (the batches then also hold the weights)
+        :type deduplicate: bool
+        """
         super().__init__()
         self.list = []
         self.dict_size = {}
+        # Sets drawn for the cases of each length, read online
+        self.length_splits = []
+        # Encoded column storing the index of the activity, if activities are not stored as "one-hot" vectors
+        self.activity_index_column = None
+        self.bucket_bounds = bucket_bounds
+        # Length of the padded prefixes of each bucket
+        self.padded_lengths = None
+        self.dataset_cache = dataset_cache
+        self.deduplicate = deduplicate
+        # Unique samples of each set and their weights, computed once
+        self.weighted_samples = {}
 
     def build(self, input_chunk_size, output_chunk_size, batch_size, orchestrator):
         """
@@ -36,169 +65,592 @@ class NextActivity(DataPreparator):
         :type orchestrator: Orchestrator
         """
         super().build(input_chunk_size, output_chunk_size, batch_size, orchestrator)
+        max_length = orchestrator.max_case_length - 1
+        bounds = [] if self.bucket_bounds is None else sorted({bound for bound in self.bucket_bounds
+                                                               if 0 < bound < max_length})
+        self.padded_lengths = np.asarray(bounds + [max_length], dtype=np.int64)
         # Create the Train (0), Validation (1) and Test (2) sets with their respective probabilities
         values = (0, 1, 2)
         probabilities = (0.7, 0.2, 0.1)
-        size = self.get_epoch_size_online()
-        # Randomly separate data into Train, Validation and Test sets
+        size = self.get_split_size()
+        # Randomly separate data into Train, Validation and Test sets (offline), and count the samples of each set once
         self.list = np.array(random.choices(values, probabilities, k=size))
-        self.dict_size[0] = self.get_epoch_size_offline(0)
-        self.dict_size[1] = self.get_epoch_size_offline(1)
-        self.dict_size[2] = self.get_epoch_size_offline(2)
+        self.weighted_samples = {}
+        counts = np.bincount(self.list, minlength=len(values))
+        for value in values:
+            self.dict_size[value] = int(counts[value])
+        self.length_splits = self.draw_length_splits(values, probabilities)
         # Create the output decoders
         # Get the first OneHot decoder, that is used for activities
         activity_decoder = None
         for encoder in self.input_decoders.encoders:
-            if encoder.name == "OneHot":
+            if encoder.name == "OneHot" or encoder.name == "OneHotIndex":
                 activity_decoder = encoder
                 break
         if activity_decoder is None:
             raise RuntimeError('No activity encoder is present, thus preventing the Data Preparator to operate')
+        if activity_decoder.name == "OneHotIndex":
+            # The outputs of the neural network stay "one-hot" vectors
+            self.activity_index_column = activity_decoder.column_ids[0]
+            activity_decoder = activity_decoder.to_one_hot_decoder()
         self.output_decoders = EncoderManager([activity_decoder])
 
+    def draw_length_splits(self, values, probabilities):
+        """
+        Randomly separates the cases read online into the Train, Validation and Test sets, length by length: the n-th
+        case of a given length takes the n-th set drawn for this length. The number of cases of each length inside each
+        set is then known before the cases are read
+
+        :param values: Sets (0 for Train, 1 for Validation, 2 for Test)
+        :type values: tuple
+        :param probabilities: Probability of each set
+        :type probabilities: tuple
+        :return: Sets drawn for the cases of each length (the index being the number of events)
+        :rtype: list
+        """
+        length_histogram = self.orchestrator.length_histogram
+        if length_histogram is None:
+            raise RuntimeError("The lengths of the cases are unknown: the data must be analyzed again")
+        case_sets = np.array(random.choices(values, probabilities, k=int(np.sum(length_histogram))), dtype=np.int64)
+        return np.split(case_sets, np.cumsum(length_histogram)[:-1])
+
+    def get_online_set(self, case_length, occurrences):
+        """
+        Returns the set of the next case read online, and counts it among the cases of its length
+
+        :param case_length: Number of events of the case
+        :type case_length: int
+        :param occurrences: Number of cases of each length already read
+        :type occurrences: np.ndarray
+        :return: Set of the case (0 for Train, 1 for Validation, 2 for Test)
+        :rtype: int
+        """
+        case_set = self.length_splits[case_length][occurrences[case_length]]
+        occurrences[case_length] += 1
+        return case_set
+
+    def get_length_histogram(self, value=None):
+        """
+        Returns the number of cases of each length read online, inside a set
+
+        :param value: Set of the cases (0 for Train, 1 for Validation, 2 for Test, None for all the cases)
+        :type value: int
+        :return: Number of cases (the index being the number of events)
+        :rtype: np.ndarray
+        """
+        if value is None:
+            return self.orchestrator.length_histogram
+        return np.asarray([np.count_nonzero(case_sets == value) for case_sets in self.length_splits], dtype=np.int64)
+
+    def get_split_size(self):
+        """
+        Returns the number of samples (here, prefixes) randomly separated into the Train, Validation and Test sets
+
+        :return: Number of samples
+        :rtype: int
+        """
+        return self.get_epoch_size_online()
+
+    def get_target(self, event):
+        """
+        Returns the "one-hot" vector of the activity of an encoded event, used as the output of the neural network
+
+        :param event: Encoded event
+        :type event: np.ndarray
+        :return: "One-hot" vector of the activity
+        :rtype: np.ndarray
+        """
+        if self.activity_index_column is None:
+            return event[:self.orchestrator.activity_counter]
+        target = np.zeros(self.orchestrator.activity_counter)
+        target[int(event[self.activity_index_column]) - 1] = 1
+        return target
+
+    def get_sequence_length(self):
+        """
+        Returns the length of the padded prefixes
+
+        :return: Number of events of a padded prefix, or None if it depends on the bucket of the batch
+        :rtype: int
+        """
+        if len(self.padded_lengths) > 1:
+            return None
+        return int(self.padded_lengths[0])
+
+    def get_output_signature(self):
+        """
+        Returns the shapes and types of the batches of prefixes and targets
+
+        :return: Specifications of the prefixes and of the targets (and of the weights, if the samples are deduplicated)
+        :rtype: tuple
+        """
+        output_signature = (tf.TensorSpec(shape=(None, self.get_sequence_length(), self.orchestrator.features_counter),
+                                          dtype=tf.float32),
+                            tf.TensorSpec(shape=(None, self.orchestrator.activity_counter), dtype=tf.float32))
+        if self.deduplicate:
+            output_signature += (tf.TensorSpec(shape=(None,), dtype=tf.float32),)
+        return output_signature
+
+    def get_batch_builders(self):
+        """
+        Creates a builder of batches of prefixes for each bucket
+
+        :return: One batch builder per bucket
+        :rtype: list
+        """
+        return [self.create_batch_builder(self.batch_size, padded_length) for padded_length in self.padded_lengths]
+
+    def create_batch_builder(self, batch_size, padded_length, buffer_counter=3):
+        """
+        Creates a builder of batches of prefixes
+
+        :param batch_size: Maximum number of prefixes inside a batch
+        :type batch_size: int
+        :param padded_length: Length of the padded prefixes
+        :type padded_length: int
+        :param buffer_counter: Number of buffers used in turn
+        :type buffer_counter: int
+        :return: Batch builder
+        :rtype: BatchBuilder
+        """
+        return BatchBuilder(batch_size, int(padded_length), self.orchestrator.features_counter,
+                            self.orchestrator.activity_counter, buffer_counter, weighted=self.deduplicate)
+
+    def get_bucket_ids(self, lengths):
+        """
+        Returns the bucket of prefixes
+
+        :param lengths: Number of events of each prefix
+        :type lengths: np.ndarray
+        :return: Index of the bucket of each prefix
+        :rtype: np.ndarray
+        """
+        return np.searchsorted(self.padded_lengths, lengths)
+
+    def get_batch(self, batch_builders, bucket_id, all_leftovers=None):
+        """
+        Returns the current batch of a bucket
+
+        :param batch_builders: Batch builders of all the buckets
+        :type batch_builders: list
+        :param bucket_id: Index of the bucket
+        :type bucket_id: int
+        :param all_leftovers: Leftovers of the prefixes of each bucket, if they must be returned
+        :type all_leftovers: list
+        :return: Prefixes, targets (and leftovers)
+        :rtype: tuple
+        """
+        batch = batch_builders[bucket_id].get_batch()
+        if all_leftovers is None:
+            return batch
+        leftovers = pd.DataFrame(data=all_leftovers[bucket_id],
+                                 columns=self.orchestrator.encoder_manager.get_leftover_names())
+        all_leftovers[bucket_id] = []
+        return batch + (leftovers,)
+
+    def fill_batches(self, batch_builders, values, starts, ends, target_ids, all_leftovers=None, leftover=None,
+                     weights=None):
+        """
+        Adds prefixes to the batches of their buckets, and yields the batches that are full
+
+        :param batch_builders: Batch builders of all the buckets
+        :type batch_builders: list
+        :param values: Encoded events the prefixes are cut from
+        :type values: np.ndarray
+        :param starts: Index of the first event of every prefix
+        :type starts: np.ndarray
+        :param ends: Index after the last event of every prefix
+        :type ends: np.ndarray
+        :param target_ids: Index of the activity following every prefix
+        :type target_ids: np.ndarray
+        :param all_leftovers: Leftovers of the prefixes of each bucket, if they must be returned
+        :type all_leftovers: list
+        :param leftover: Leftovers shared by all the prefixes
+        :type leftover: np.ndarray
+        :param weights: Weight of every prefix (by default, 1)
+        :type weights: np.ndarray
+        :return: Generator of batches
+        :rtype: Generator
+        """
+        bucket_ids = self.get_bucket_ids(ends - starts)
+        for bucket_id in np.unique(bucket_ids):
+            in_bucket = bucket_ids == bucket_id
+            bucket_starts, bucket_ends, bucket_targets = starts[in_bucket], ends[in_bucket], target_ids[in_bucket]
+            bucket_weights = None if weights is None else weights[in_bucket]
+            while len(bucket_ends) > 0:
+                added = batch_builders[bucket_id].add(values, bucket_starts, bucket_ends, bucket_targets,
+                                                      bucket_weights)
+                bucket_starts, bucket_ends = bucket_starts[added:], bucket_ends[added:]
+                bucket_targets = bucket_targets[added:]
+                bucket_weights = None if weights is None else bucket_weights[added:]
+                if all_leftovers is not None:
+                    all_leftovers[bucket_id].extend([leftover] * added)
+                if batch_builders[bucket_id].is_full():
+                    yield self.get_batch(batch_builders, bucket_id, all_leftovers)
+
+    def flush_batches(self, batch_builders, all_leftovers=None):
+        """
+        Yields the batches that are not complete, at the end of an epoch
+
+        :param batch_builders: Batch builders of all the buckets
+        :type batch_builders: list
+        :param all_leftovers: Leftovers of the prefixes of each bucket, if they must be returned
+        :type all_leftovers: list
+        :return: Generator of batches
+        :rtype: Generator
+        """
+        for bucket_id, batch_builder in enumerate(batch_builders):
+            if batch_builder.counter > 0:
+                yield self.get_batch(batch_builders, bucket_id, all_leftovers)
+
+    def get_step_counter(self, bucket_counters):
+        """
+        Returns the number of batches needed to read prefixes, each bucket having its own batches
+
+        :param bucket_counters: Number of prefixes inside each bucket
+        :type bucket_counters: np.ndarray
+        :return: Number of batches
+        :rtype: int
+        """
+        return int(sum(ceil(bucket_counter / self.batch_size) for bucket_counter in bucket_counters))
+
     def run_online(self, value=None, get_leftovers=False):
         """
         Slices cases into suffixes and prefixes (online mode)
 
         """
+        batch_builders = self.get_batch_builders()
+        all_leftovers = [[] for _ in batch_builders] if get_leftovers else None
         while True:
-            iterator = 0
-            prefixes = []
-            suffixes = []
-            if get_leftovers:
-                all_leftovers = []
-                leftovers_names = self.orchestrator.encoder_manager.get_leftover_names()
+            occurrences = np.zeros(len(self.length_splits), dtype=np.int64)
             for case, leftover in self.orchestrator.process_online(self.input_chunk_size):
-                if value is None or self.list[iterator] == value:
-                    i = 1
-                    while i < len(case):
-                        prefixes.append(case[:i])
-                        suffixes.append(case[i, :self.orchestrator.activity_counter])
-                        if get_leftovers:
-                            all_leftovers.append(leftover)
-                        i += 1
-                        if len(prefixes) == self.batch_size:
-                            prefixes = tf.keras.preprocessing.sequence.pad_sequences(prefixes, padding='post',
-                                                                                     maxlen=self.orchestrator.max_case_length-1,
-                                                                                     dtype=float)
-                            suffixes = np.array(suffixes, dtype=float)
-                            if get_leftovers:
-                                all_leftovers = pd.DataFrame(data=all_leftovers, columns=leftovers_names)
-                                yield prefixes, suffixes, all_leftovers
-                            else:
-                                yield prefixes, suffixes
-                            prefixes = []
-                            suffixes = []
-                            if get_leftovers:
-                                all_leftovers = []
-                iterator += 1
-            if len(prefixes) > 0:
-                prefixes = tf.keras.preprocessing.sequence.pad_sequences(prefixes, padding='post',
-                                                                         maxlen=self.orchestrator.max_case_length-1,
-                                                                         dtype=float)
-                suffixes = np.array(suffixes, dtype=float)
-                if get_leftovers:
-                    all_leftovers = pd.DataFrame(data=all_leftovers, columns=leftovers_names)
-                    yield prefixes, suffixes, all_leftovers
-                else:
-                    yield prefixes, suffixes
+                case_set = self.get_online_set(len(case), occurrences)
+                if value is None or case_set == value:
+                    # Every event of the case, except the first one, ends a prefix
+                    ends = np.arange(1, len(case))
+                    yield from self.fill_batches(batch_builders, case, np.zeros(len(ends), dtype=np.int64), ends,
+                                                 self.get_target_ids(case[1:]), all_leftovers, leftover)
+            yield from self.flush_batches(batch_builders, all_leftovers)
 
     def get_epoch_size_online(self, value=None):
         if value is None:
-            total = 0
-            for cases in self.orchestrator.edit_online(self.input_chunk_size, self.output_chunk_size):
-                for case in cases:
-                    total += len(case) - 1
+            # Computed from the lengths of the edited cases, recorded when the data was analyzed
+            total = self.orchestrator.get_prefix_counter()
             print(total, "cases")
         else:
-            total = np.count_nonzero(self.list == value)
+            total = int(np.sum(self.get_length_counters(value)))
         return total
 
+    def get_step_counter_online(self, value=None):
+        """
+        Returns the number of batches of an epoch (online mode), computed from the lengths of the cases of the set
+
+        :param value: Set of the prefixes (0 for Train, 1 for Validation, 2 for Test, None for all the prefixes)
+        :type value: int
+        :return: Number of batches
+        :rtype: int
+        """
+        length_counters = self.get_length_counters(value)
+        bucket_counters = np.bincount(self.get_bucket_ids(np.arange(len(length_counters))), weights=length_counters,
+                                      minlength=len(self.padded_lengths))
+        return self.get_step_counter(bucket_counters)
+
+    def get_length_counters(self, value=None):
+        """
+        Returns the number of prefixes of each length (online mode), computed from the lengths of the cases
+
+        :param value: Set of the prefixes (0 for Train, 1 for Validation, 2 for Test, None for all the prefixes)
+        :type value: int
+        :return: Number of prefixes (the index being the number of events)
+        :rtype: np.ndarray
+        """
+        # Number of cases longer than each length: a case of n events has one prefix of each length below n
+        longer_cases = np.cumsum(self.get_length_histogram(value)[::-1])[::-1]
+        return np.append(0, longer_cases[2:])
+
+    def get_target_ids(self, events):
+        """
+        Returns the indexes of the activities of encoded events
+
+        :param events: Encoded events, one per row
+        :type events: np.ndarray
+        :return: Index of the activity of each event
+        :rtype: np.ndarray
+        """
+        if self.activity_index_column is None:
+            return np.argmax(events[:, :self.orchestrator.activity_counter], axis=1)
+        return events[:, self.activity_index_column].astype(np.int64) - 1
+
+    def get_prefix_index_path(self):
+        return "Output/" + self.orchestrator.output_name + "/prefix_index.bin"
+
     def run_offline(self):
-        write_attribute = "wb"
-        with open("Output/" + self.orchestrator.output_name + "/data.npy", 'rb') as input_file:
-            with tqdm(total=self.orchestrator.case_counter, desc='Slice into prefix/suffix') as pbar:
-                case_counter = 0
-                prefixes = []
-                suffixes = []
-                # Add all the cases to a list
-                while case_counter < self.orchestrator.case_counter:
-                    case = np.load(input_file, allow_pickle=True)
-                    case_counter += 1
-                    pbar.update(1)
-                    i = 1
-                    while i < len(case):
-                        prefixes.append(case[:i])
-                        suffixes.append(case[i, :self.orchestrator.activity_counter])
-                        i += 1
-                        if len(prefixes) == self.output_chunk_size or case_counter == self.orchestrator.case_counter:
-                            # Write the results!
-                            # If we are in the first chunk, create a new file. Else, append
-                            with open("Output/" + self.orchestrator.output_name +  "/prefixes.npy",
-                                      write_attribute) as output_file:
-                                for prefix in prefixes:
-                                    np.save(output_file, prefix)
-                            with open("Output/" + self.orchestrator.output_name +  "/suffixes.npy",
-                                      write_attribute) as output_file:
-                                for suffix in suffixes:
-                                    np.save(output_file, suffix)
-                            if write_attribute == "wb":
-                                write_attribute = "ab"
-                            prefixes = []
-                            suffixes = []
+        """
+        Indexes the prefixes of the encoded cases (offline mode). Prefixes are not written: each one is stored as a
+        (index of the case, position of the event after the prefix, index of the activity of this event) triple, and
+        cut from the encoded cases when read
+
+        """
+        encoded_store = EncodedStore(self.orchestrator.output_name).open_for_reading()
+        case_counter = encoded_store.get_case_counter()
+        with open(self.get_prefix_index_path(), 'wb') as output_file:
+            with tqdm(total=case_counter, desc='Index prefix/suffix') as pbar:
+                for start in range(0, case_counter, self.output_chunk_size):
+                    stop = min(start + self.output_chunk_size, case_counter)
+                    # Every event of a case, except the first one, ends a prefix
+                    prefix_counters = np.maximum(encoded_store.get_lengths(start, stop) - 1, 0)
+                    case_ids = np.repeat(np.arange(start, stop), prefix_counters)
+                    first_prefixes = np.repeat(np.cumsum(prefix_counters) - prefix_counters, prefix_counters)
+                    ends = np.arange(len(case_ids)) - first_prefixes + 1
+                    target_ids = self.get_target_ids(encoded_store.values[encoded_store.offsets[case_ids] + ends])
+                    output_file.write(np.column_stack((case_ids, ends, target_ids)).astype(np.int64).tobytes())
+                    pbar.update(stop - start)
+        self.weighted_samples = {}
+
+    def read_prefix_index(self):
+        """
+        Reads the index of the prefixes built by run_offline, mapped into memory
+
+        :return: One (index of the case, position of the event after the prefix, index of the activity) row per prefix
+        :rtype: np.ndarray
+        """
+        if not os.path.exists(self.get_prefix_index_path()):
+            raise RuntimeError("The prefixes of " + self.orchestrator.output_name + " were not indexed: run_offline "
+                               "must be called first")
+        if os.path.getsize(self.get_prefix_index_path()) == 0:
+            return np.empty((0, 3), dtype=np.int64)
+        return np.memmap(self.get_prefix_index_path(), dtype=np.int64, mode='r').reshape(-1, 3)
+
+    def get_sample_index(self):
+        """
+        Returns the index of the samples read offline: one row per sample, the first two columns being the index of its
+        case and its number of events (here, the index of the prefixes)
+
+        :return: Index of the samples
+        :rtype: np.ndarray
+        """
+        return self.read_prefix_index()
+
+    def get_selected_samples(self, sample_index, value=None):
+        """
+        Returns the samples of a set, in the order of the index
+
+        :param sample_index: Index of the samples
+        :type sample_index: np.ndarray
+        :param value: Set of the samples (0 for Train, 1 for Validation, 2 for Test, None for all the samples)
+        :type value: int
+        :return: Rows of the index of the samples of the set
+        :rtype: np.ndarray
+        """
+        if value is None:
+            return np.arange(len(sample_index))
+        return np.flatnonzero(self.list[:len(sample_index)] == value)
+
+    def get_prefix_nodes(self, encoded_store):
+        """
+        Builds a trie of all the encoded prefixes: two prefixes share the same node if they have the exact same encoded
+        events. The trie is built level by level (the n-th level holding the prefixes of n events), with vectorized
+        operations
+
+        :param encoded_store: Store of the encoded cases
+        :type encoded_store: EncodedStore
+        :return: Node of the prefix ending with each stored event
+        :rtype: np.ndarray
+        """
+        values = np.ascontiguousarray(encoded_store.values)
+        # Identical encoded events share the same symbol
+        events = values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).ravel()
+        symbols = np.unique(events, return_inverse=True)[1].ravel()
+        symbol_counter = int(symbols.max()) + 1 if len(symbols) > 0 else 1
+        lengths = encoded_store.get_lengths()
+        # Cases from the longest to the shortest: the cases reaching a level are the first ones
+        cases = np.argsort(-lengths, kind='stable')
+        first_rows = encoded_store.offsets[cases]
+        case_counters = np.searchsorted(-lengths[cases], -np.arange(lengths.max() if len(lengths) > 0 else 0),
+                                        side='left')
+        nodes = np.empty(len(symbols), dtype=np.int64)
+        parents = np.zeros(len(cases), dtype=np.int64)
+        node_counter = 1
+        for level, case_counter in enumerate(case_counters):
+            rows = first_rows[:case_counter] + level
+            keys = parents[:case_counter] * symbol_counter + symbols[rows]
+            unique_keys, children = np.unique(keys, return_inverse=True)
+            parents[:case_counter] = children.ravel() + node_counter
+            nodes[rows] = parents[:case_counter]
+            node_counter += len(unique_keys)
+        return nodes
+
+    def get_weighted_samples(self, sample_index, value=None):
+        """
+        Returns the samples of a set, and their weights. If the samples are deduplicated, only the first occurrence of
+        each (prefix, next activity) pair is kept, its weight being its number of occurrences inside the set
+
+        :param sample_index: Index of the samples
+        :type sample_index: np.ndarray
+        :param value: Set of the samples (0 for Train, 1 for Validation, 2 for Test, None for all the samples)
+        :type value: int
+        :return: Rows of the index of the samples of the set, and their weights (None if they are not deduplicated)
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        selected = self.get_selected_samples(sample_index, value)
+        if not self.deduplicate:
+            return selected, None
+        if value not in self.weighted_samples:
+            encoded_store = EncodedStore(self.orchestrator.output_name).open_for_reading()
+            nodes = self.get_prefix_nodes(encoded_store)
+            rows = sample_index[selected]
+            # A prefix is identified by the node of its last event
+            keys = nodes[encoded_store.offsets[rows[:, 0]] + rows[:, 1] - 1] * self.orchestrator.activity_counter \
+                + rows[:, 2]
+            _, first_samples, weights = np.unique(keys, return_index=True, return_counts=True)
+            order = np.argsort(first_samples)
+            self.weighted_samples[value] = (selected[first_samples[order]], weights[order].astype(np.float32))
+            print(len(selected), "samples,", len(order), "unique samples")
+        return self.weighted_samples[value]
 
     def read_offline(self, value=None):
         """
-        Slices cases into suffixes and prefixes (online mode)
+        Slices cases into suffixes and prefixes (offline mode)
+
+        """
+        encoded_store = EncodedStore(self.orchestrator.output_name).open_for_reading()
+        sample_index = self.get_sample_index()
+        selected, weights = self.get_weighted_samples(sample_index, value)
+        batch_builders = self.get_batch_builders()
+        while True:
+            for position in range(0, len(selected), self.batch_size):
+                rows = sample_index[selected[position:position + self.batch_size]]
+                # The prefixes are cut from the events of all the stored cases
+                starts = encoded_store.offsets[rows[:, 0]]
+                yield from self.fill_batches(batch_builders, encoded_store.values, starts, starts + rows[:, 1],
+                                             rows[:, 2], weights=None if weights is None else
+                                             weights[position:position + self.batch_size])
+            yield from self.flush_batches(batch_builders)
 
+    def get_batch_plan(self, sample_index, value=None):
         """
-        with open("Output/" + self.orchestrator.output_name + "/prefixes.npy", 'rb') as input_file1:
-            with open("Output/" + self.orchestrator.output_name + "/suffixes.npy", 'rb') as input_file2:
-                epoch_size = self.get_epoch_size_offline(value)
-                while True:
-                    iterator = 0
-                    for chunk_index in range(
-                            get_total_chunk_number(epoch_size, self.batch_size)):
-                        prefixes = []
-                        suffixes = []
-                        counter = 0
-                        if chunk_index == get_total_chunk_number(epoch_size, self.batch_size) - 1:
-                            chunk_range = epoch_size % self.batch_size
-                        # Else, the number of cases if equal of the size of a chunk
-                        else:
-                            chunk_range = self.batch_size
-                        while counter < chunk_range:
-                            if value is None or self.list[iterator] == value:
-                                prefixes.append(np.load(input_file1, allow_pickle=True))
-                                suffixes.append(np.load(input_file2, allow_pickle=True))
-                                counter += 1
-                            iterator += 1
-                        prefixes = tf.keras.preprocessing.sequence.pad_sequences(prefixes, padding='post',
-                                                                                 maxlen=self.orchestrator.max_case_length-1,
-                                                                                 dtype=float)
-                        suffixes = np.array(suffixes)
-                        yield prefixes, suffixes
-                    input_file1.seek(0)
-                    input_file2.seek(0)
+        Splits the samples of a set into batches, each one inside a single bucket. The batches are sorted in the
+        order read_offline yields them
+
+        :param sample_index: Index of the samples
+        :type sample_index: np.ndarray
+        :param value: Set of the samples (0 for Train, 1 for Validation, 2 for Test, None for all the samples)
+        :type value: int
+        :return: Rows of the index sorted by bucket, their weights (None if the samples are not deduplicated), and for
+        each batch its first and last rows (in the sorted rows) and its bucket
+        :rtype: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        """
+        selected, weights = self.get_weighted_samples(sample_index, value)
+        bucket_ids = self.get_bucket_ids(sample_index[selected, 1])
+        order = np.argsort(bucket_ids, kind='stable')
+        bucket_limits = np.searchsorted(bucket_ids[order], np.arange(len(self.padded_lengths) + 1))
+        batches = []
+        for bucket_id in range(len(self.padded_lengths)):
+            for first in range(bucket_limits[bucket_id], bucket_limits[bucket_id + 1], self.batch_size):
+                last = min(first + self.batch_size, bucket_limits[bucket_id + 1])
+                # A full batch is yielded when its last sample is read, the others at the end of the epoch
+                if last - first == self.batch_size:
+                    key = (0, order[last - 1] // self.batch_size, bucket_id)
+                else:
+                    key = (1, 0, bucket_id)
+                batches.append((key, first, last, bucket_id))
+        batches.sort()
+        firsts, lasts, batch_buckets = (np.asarray([batch[i] for batch in batches], dtype=np.int64)
+                                        for i in (1, 2, 3))
+        return selected[order], None if weights is None else weights[order], firsts, lasts, batch_buckets
+
+    def get_dataset_offline(self, value=None, parallel_calls=tf.data.AUTOTUNE):
+        """
+        Creates a dataset of batches of prefixes and targets, cut from the encoded cases (offline mode). The batches are
+        the ones of read_offline, in the same order, but are built by several threads while the neural network trains.
+        They are cached if dataset_cache is set, and the dataset repeats itself
+
+        :param value: Set of the prefixes (0 for Train, 1 for Validation, 2 for Test, None for all the prefixes)
+        :type value: int
+        :param parallel_calls: Number of batches built at the same time
+        :type parallel_calls: int
+        :return: Dataset of batches, with the signature given by get_output_signature
+        :rtype: tf.data.Dataset
+        """
+        encoded_store = EncodedStore(self.orchestrator.output_name).open_for_reading()
+        sample_index = self.get_sample_index()
+        rows, weights, firsts, lasts, batch_buckets = self.get_batch_plan(sample_index, value)
+
+        def build_batch(batch_id):
+            batch_rows = sample_index[rows[firsts[batch_id]:lasts[batch_id]]]
+            starts = encoded_store.offsets[batch_rows[:, 0]]
+            # Tensors may share the memory of the returned arrays: every batch gets its own buffer
+            batch_builder = self.create_batch_builder(len(batch_rows), self.padded_lengths[batch_buckets[batch_id]],
+                                                      buffer_counter=1)
+            batch_builder.add(encoded_store.values, starts, starts + batch_rows[:, 1], batch_rows[:, 2],
+                              None if weights is None else weights[firsts[batch_id]:lasts[batch_id]])
+            return batch_builder.get_batch()
+
+        output_signature = self.get_output_signature()
+
+        def load_batch(batch_id):
+            batch = tf.numpy_function(build_batch, [batch_id], [spec.dtype for spec in output_signature])
+            return tuple(tf.ensure_shape(tensor, spec.shape) for tensor, spec in zip(batch, output_signature))
+
+        dataset = tf.data.Dataset.range(len(firsts)).map(load_batch, num_parallel_calls=parallel_calls,
+                                                          deterministic=True)
+        if self.dataset_cache:
+            # Each set has its own cache file. The files of a previous build (whose sets were drawn differently) are
+            # removed
+            cache_path = self.dataset_cache + "_" + ("all" if value is None else str(value))
+            for cache_file in glob.glob(glob.escape(cache_path) + ".*"):
+                os.remove(cache_file)
+            dataset = dataset.cache(cache_path)
+        elif self.dataset_cache is not None:
+            dataset = dataset.cache()
+        return dataset.repeat().prefetch(tf.data.AUTOTUNE)
 
     def get_epoch_size_offline(self, value=None):
-        if value is None:
-            total = 0
-            with open("Output/" + self.orchestrator.output_name + "/suffixes.npy", 'rb') as input_file:
-                while True:
-                    try:
-                        np.load(input_file, allow_pickle=True)
-                        total += 1
-                    except:
-                        break
+        if self.deduplicate:
+            total = len(self.get_weighted_samples(self.get_sample_index(), value)[0])
+        elif value is None:
+            # Every event of a case, except the first one, is the suffix of a prefix
+            encoded_store = EncodedStore(self.orchestrator.output_name).open_for_reading()
+            total = encoded_store.get_prefix_counter()
             print(total, "cases")
         else:
-            total = np.count_nonzero(self.list == value)
+            total = self.dict_size[value]
         return total
 
+    def get_step_counter_offline(self, value=None):
+        """
+        Returns the number of batches of an epoch (offline mode)
+
+        :param value: Set of the prefixes (0 for Train, 1 for Validation, 2 for Test, None for all the prefixes)
+        :type value: int
+        :return: Number of batches
+        :rtype: int
+        """
+        sample_index = self.get_sample_index()
+        lengths = sample_index[self.get_weighted_samples(sample_index, value)[0], 1]
+        return self.get_step_counter(np.bincount(self.get_bucket_ids(lengths), minlength=len(self.padded_lengths)))
+
     def decode_single_input(self, input):
         return self.input_decoders.encode_case(input[~np.all(input == 0, axis=1)])
 
+    def decode_input_batch(self, inputs):
+        """
+        Decodes padded inputs all at once: the padding (events made of zeros) of every input is removed with a single
+        mask, and each decoder is called once for all the remaining events. The leftovers of the decoders are used as
+        with decode_single_input
+
+        :param inputs: Padded inputs of the neural network
+        :type inputs: np.ndarray
+        :return: Decoded events of every input
+        :rtype: list
+        """
+        inputs = np.asarray(inputs)
+        is_event = np.any(inputs != 0, axis=2)
+        events = inputs[is_event]
+        offsets = np.append(0, np.cumsum(np.count_nonzero(is_event, axis=1)))
+        decoded_events = self.input_decoders.decode_batch([events[:, i] for i in range(events.shape[1])], offsets)
+        return np.split(decoded_events, offsets[1:-1])
+
     def decode_single_output(self, output):
         raw_result = self.output_decoders.encode_case(output)
         sos_indices = np.where(raw_result == "SoS")
@@ -208,3 +660,15 @@ class NextActivity(DataPreparator):
             cut = sos_indices[0][-1]
             return raw_result[cut:]
 
+    def decode_output_batch(self, outputs, k=1):
+        """
+        Decodes outputs of the neural network all at once: returns the k most probable next activities of every output
+
+        :param outputs: Probability of every activity, one row per output
+        :type outputs: np.ndarray
+        :param k: Number of activities to return per output
+        :type k: int
+        :return: The k most probable activities of every output, and their probabilities
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        return self.output_decoders.encoders[0].encode_top_k(outputs, k)
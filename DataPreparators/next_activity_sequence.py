@@ -0,0 +1,139 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from DataPreparators.batch_builder import SequenceBatchBuilder
+from DataPreparators.next_activity import NextActivity
+from Managers.encoded_store import EncodedStore
+
+
+class NextActivitySequence(NextActivity):
+    def __init__(self, bucket_bounds=None, dataset_cache=None):
+        """
+        Prepares the cases to predict the next activity after every event at once ("many-to-many" mode): each case is
+        given once to the neural network, whose output at the time step t is the activity of the event t + 1. This
+        gives the same targets as the prefixes of NextActivity, with a single pass over every case. The Train,
+        Validation and Test sets are drawn case by case
+
+        :param bucket_bounds: Maximum lengths of the buckets, used to group cases of similar lengths inside the same
+        batches. By default, there is a single bucket
+        :type bucket_bounds: list
+        :param dataset_cache: Cache of the batches of the offline datasets, after the first epoch: "" to keep them in
+        memory, or the prefix of the paths of local files. By default, the batches are built again at every epoch
+        :type dataset_cache: str
+        """
+        super().__init__(bucket_bounds, dataset_cache)
+
+    def get_split_size(self):
+        """
+        Returns the number of samples (here, cases) randomly separated into the Train, Validation and Test sets
+
+        :return: Number of samples
+        :rtype: int
+        """
+        return self.orchestrator.case_counter
+
+    def get_output_signature(self):
+        """
+        Returns the shapes and types of the batches of cases, targets and weights of the time steps
+
+        :return: Specifications of the cases, of the targets and of the weights
+        :rtype: (tf.TensorSpec, tf.TensorSpec, tf.TensorSpec)
+        """
+        sequence_length = self.get_sequence_length()
+        return (tf.TensorSpec(shape=(None, sequence_length, self.orchestrator.features_counter), dtype=tf.float32),
+                tf.TensorSpec(shape=(None, sequence_length, self.orchestrator.activity_counter), dtype=tf.float32),
+                tf.TensorSpec(shape=(None, sequence_length), dtype=tf.float32))
+
+    def create_batch_builder(self, batch_size, padded_length, buffer_counter=3):
+        """
+        Creates a builder of batches of cases
+
+        :param batch_size: Maximum number of cases inside a batch
+        :type batch_size: int
+        :param padded_length: Length of the padded cases (without their last event)
+        :type padded_length: int
+        :param buffer_counter: Number of buffers used in turn
+        :type buffer_counter: int
+        :return: Batch builder
+        :rtype: SequenceBatchBuilder
+        """
+        return SequenceBatchBuilder(batch_size, int(padded_length), self.orchestrator.features_counter,
+                                    self.orchestrator.activity_counter, self.get_target_ids, buffer_counter)
+
+    def run_online(self, value=None, get_leftovers=False):
+        """
+        Yields batches of cases, with their targets and weights (online mode)
+
+        """
+        batch_builders = self.get_batch_builders()
+        all_leftovers = [[] for _ in batch_builders] if get_leftovers else None
+        while True:
+            occurrences = np.zeros(len(self.length_splits), dtype=np.int64)
+            for case, leftover in self.orchestrator.process_online(self.input_chunk_size):
+                case_set = self.get_online_set(len(case), occurrences)
+                # A case needs two events to have a target
+                if (value is None or case_set == value) and len(case) > 1:
+                    yield from self.fill_batches(batch_builders, case, np.zeros(1, dtype=np.int64),
+                                                 np.asarray([len(case) - 1]), np.zeros(1, dtype=np.int64),
+                                                 all_leftovers, leftover)
+            yield from self.flush_batches(batch_builders, all_leftovers)
+
+    def get_epoch_size_online(self, value=None):
+        # Only the cases with at least two events have targets
+        return int(np.sum(self.get_length_counters(value)))
+
+    def get_length_counters(self, value=None):
+        """
+        Returns the number of cases of each length (without their last event, online mode), computed from the lengths of
+        the cases
+
+        :param value: Set of the cases (0 for Train, 1 for Validation, 2 for Test, None for all the cases)
+        :type value: int
+        :return: Number of cases (the index being the number of events)
+        :rtype: np.ndarray
+        """
+        return np.append(0, self.get_length_histogram(value)[2:])
+
+    def run_offline(self):
+        """
+        Nothing to prepare offline: the cases are read directly from the encoded cases
+
+        """
+        pass
+
+    def get_sample_index(self):
+        """
+        Returns the index of the cases read offline: one (index of the case, number of events without the last one,
+        unused) row per case with at least two events
+
+        :return: Index of the cases
+        :rtype: np.ndarray
+        """
+        lengths = EncodedStore(self.orchestrator.output_name).open_for_reading().get_lengths()
+        case_ids = np.flatnonzero(lengths > 1)
+        return np.column_stack((case_ids, lengths[case_ids] - 1, np.zeros(len(case_ids), dtype=np.int64)))
+
+    def get_selected_samples(self, sample_index, value=None):
+        """
+        Returns the cases of a set, in the order of the index
+
+        :param sample_index: Index of the cases
+        :type sample_index: np.ndarray
+        :param value: Set of the cases (0 for Train, 1 for Validation, 2 for Test, None for all the cases)
+        :type value: int
+        :return: Rows of the index of the cases of the set
+        :rtype: np.ndarray
+        """
+        if value is None:
+            return np.arange(len(sample_index))
+        return np.flatnonzero(self.list[sample_index[:, 0]] == value)
+
+    def get_epoch_size_offline(self, value=None):
+        return len(self.get_selected_samples(self.get_sample_index(), value))
@@ -7,6 +7,8 @@ Licence: AGPL v3
 
 import numpy as np
 
+from case_batch import CaseBatch
+
 
 class Editor:
     def __init__(self, name) -> None:
@@ -19,6 +21,8 @@ class Editor:
         super().__init__()
         self.name = name
         self.activities_to_add = set()
+        # Defines if the editor changes the end of the cases, that is not known yet while a case is running
+        self.edits_end = False
 
     def alter_orchestrator_infos(self, orchestrator):
         """
@@ -41,3 +45,17 @@ class Editor:
         :rtype: np.ndarray
         """
         pass
+
+    def edit_batch(self, batch, orchestrator):
+        """
+        Edits all the cases of a batch. By default, each case is edited on its own: editors should override this
+        method to edit the whole batch at once
+
+        :param batch: Cases to process
+        :type batch: CaseBatch
+        :param orchestrator: Orchestrator
+        :type orchestrator: Orchestrator
+        :return: Edited cases
+        :rtype: CaseBatch
+        """
+        return CaseBatch.from_cases([self.edit_case(case, orchestrator) for case in batch.get_cases()])
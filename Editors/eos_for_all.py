@@ -12,9 +12,12 @@ class EosForAll(Editor):
     def __init__(self) -> None:
         super().__init__("EosForAll")
         self.activities_to_add = {"EoS"}
+        self.edits_end = True
 
     def alter_orchestrator_infos(self, orchestrator):
         orchestrator.max_case_length += 1
+        # Every case has one more event
+        orchestrator.length_histogram = np.insert(orchestrator.length_histogram, 0, 0)
 
     def edit_case(self, case, orchestrator):
         """
@@ -27,14 +30,26 @@ class EosForAll(Editor):
         :return: Case with an "End of State" activity to the end
         :rtype: np.ndarray
         """
+        return self.edit_batch(CaseBatch.from_cases([case]), orchestrator).get_case(0)
+
+    def edit_batch(self, batch, orchestrator):
+        """
+        Adds an "End of State" activity to the end of every case of the batch. It takes the case ID, the end date and
+        the other values of the last event of the case
+
+        :param batch: Cases to process
+        :type batch: CaseBatch
+        :param orchestrator: Orchestrator
+        :type orchestrator: Orchestrator
+        :return: Cases with an "End of State" activity to the end
+        :rtype: CaseBatch
+        """
+        last_rows = batch.get_last_rows()
+        columns = batch.columns
         if not orchestrator.double_timestamps:
-            if len(case[0]) == 3:
-                new_case = np.vstack((case, [case[0, 0], "EoS", case[-1, -1]]))
-            else:
-                new_case = np.vstack((case, np.hstack(([case[0, 0], "EoS", case[-1, 2]], case[-1, 3:]))))
+            values = [columns[0][last_rows], "EoS", columns[2][last_rows]]
+            values += [column[last_rows] for column in columns[3:]]
         else:
-            if len(case[0]) == 4:
-                new_case = np.vstack((case, [case[0, 0], "EoS", case[-1, -1], case[-1, -1]]))
-            else:
-                new_case = np.vstack((case, np.hstack(([case[0, 0], "EoS", case[-1, 3], case[-1, 3]], case[-1, 4:]))))
-        return new_case
+            values = [columns[0][last_rows], "EoS", columns[3][last_rows], columns[3][last_rows]]
+            values += [column[last_rows] for column in columns[4:]]
+        return batch.insert_rows(batch.offsets[1:], values)
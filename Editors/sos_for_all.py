@@ -15,6 +15,8 @@ class SosForAll(Editor):
 
     def alter_orchestrator_infos(self, orchestrator):
         orchestrator.max_case_length += 1
+        # Every case has one more event
+        orchestrator.length_histogram = np.insert(orchestrator.length_histogram, 0, 0)
 
     def edit_case(self, case, orchestrator):
         """
@@ -27,14 +29,25 @@ class SosForAll(Editor):
         :return: Case with a "Start of State" activity to the beginning
         :rtype: np.ndarray
         """
+        return self.edit_batch(CaseBatch.from_cases([case]), orchestrator).get_case(0)
+
+    def edit_batch(self, batch, orchestrator):
+        """
+        Adds a "Start of State" activity to the beginning of every case of the batch. It takes the case ID, the start
+        date and the other values of the first event of the case
+
+        :param batch: Cases to process
+        :type batch: CaseBatch
+        :param orchestrator: Orchestrator
+        :type orchestrator: Orchestrator
+        :return: Cases with a "Start of State" activity to the beginning
+        :rtype: CaseBatch
+        """
+        first_rows = batch.get_first_rows()
+        columns = batch.columns
+        values = [columns[0][first_rows], "SoS", columns[2][first_rows]]
         if not orchestrator.double_timestamps:
-            if len(case[0]) == 3:
-                new_case = np.vstack(([case[0, 0], "SoS", case[0, -1]], case))
-            else:
-                new_case = np.vstack((np.hstack(([case[0, 0], "SoS", case[0, 2]], case[0, 3:])), case))
+            values += [column[first_rows] for column in columns[3:]]
         else:
-            if len(case[0]) == 4:
-                new_case = np.vstack(([case[0, 0], "SoS", case[0, 2], case[0, 2]], case))
-            else:
-                new_case = np.vstack((np.hstack(([case[0, 0], "SoS", case[0, 2], case[0, 2]], case[-1, 4:])), case))
-        return new_case
+            values += [columns[2][first_rows]] + [column[batch.get_last_rows()] for column in columns[4:]]
+        return batch.insert_rows(first_rows, values)
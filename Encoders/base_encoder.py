@@ -6,7 +6,9 @@ Licence: AGPL v3
 """
 
 import numpy as np
+import pandas as pd
 
+from case_batch import CaseBatch, as_object_column
 from column_type import ColumnType
 
 
@@ -27,6 +29,8 @@ class Encoder:
         self.output_column_names = None
         # Optional attributes
         self.leftover_name = None
+        # Type of the encoded values, used to allocate the encoded chunks
+        self.output_dtype = np.float64
 
     def set_leftover_name(self, column_id):
         """
@@ -46,15 +50,63 @@ class Encoder:
         """
         pass
 
+    def encode_batch(self, values, offsets):
+        """
+        Encodes all the cases of a batch at once. By default, each case is encoded on its own: encoders should override
+        this method with a vectorized version
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Encoded events of all the cases
+        :rtype: np.ndarray
+        """
+        return np.vstack([self.encode_case(case) for case in CaseBatch(values, offsets).get_cases()])
+
     def update_encoder(self, chunk):
         """
-        Updates the internal representation of the encoder. Optional function, only for encoders
+        Updates the internal representation of the encoder. Optional function, only for encoders. By default, the
+        partial state of the chunk is merged into the encoder
 
         :param chunk: Chunk to process (here, a chunk of a file)
         :type chunk: pd.DataFrame
         """
+        self.merge(self.get_partial_state(chunk))
+
+    def get_partial_state(self, chunk):
+        """
+        Computes what the encoder needs to know about a chunk, without changing the encoder. The chunks can then be
+        analyzed at the same time (in separate processes), and their partial states merged afterwards. Optional
+        function, only for encoders
+
+        :param chunk: Chunk to process (here, a chunk of a file)
+        :type chunk: pd.DataFrame
+        :return: Partial state of the chunk (must be picklable)
+        :rtype: Any
+        """
+        return None
+
+    def merge(self, partial_state):
+        """
+        Merges the partial state of a chunk into the internal representation of the encoder. The partial states are
+        merged in the order of the chunks. Optional function, only for encoders
+
+        :param partial_state: Partial state of a chunk
+        :type partial_state: Any
+        """
         pass
 
+    def is_mergeable(self):
+        """
+        Checks if the encoder can be updated with partial states. It is not the case for encoders that only define
+        update_encoder
+
+        :return: True if the encoder relies on partial states
+        :rtype: bool
+        """
+        return type(self).update_encoder is Encoder.update_encoder
+
     def finalize(self):
         """
         Makes the final operations to the internal representation of the encoder. Optional function, only for encoders
@@ -71,6 +123,19 @@ class Encoder:
         """
         pass
 
+    def get_leftover_batch(self, values, offsets):
+        """
+        Returns the leftovers of all the cases of a batch. By default, each case is processed on its own
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: One leftover per case
+        :rtype: np.ndarray
+        """
+        return np.asarray([self.get_leftover(case) for case in CaseBatch(values, offsets).get_cases()])
+
     def set_leftover(self, leftover):
         """
         Sets the leftover of the decoder. Optional function, only for decoders
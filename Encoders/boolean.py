@@ -29,7 +29,20 @@ class BooleanEncoder(SingleColumnEncoder):
         :return: Encoded column
         :rtype: np.ndarray
         """
-        return (1.0 * case[:, self.column_id]).reshape(-1, 1)
+        return self.encode_batch([case[:, i] for i in range(case.shape[1])], [0, len(case)])
+
+    def encode_batch(self, values, offsets):
+        """
+        Returns the encoded column of all the cases of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Encoded column
+        :rtype: np.ndarray
+        """
+        return values[self.column_id].astype(float).reshape(-1, 1)
 
 
 class BooleanDecoder(SingleColumnEncoder):
@@ -59,4 +72,17 @@ class BooleanDecoder(SingleColumnEncoder):
         :return: Original column
         :rtype: np.ndarray
         """
-        return np.asarray(["True" if value == 1 else "False" for value in case[:, self.column_id]]).reshape(-1, 1)
+        return np.where(case[:, self.column_id] == 1, "True", "False").reshape(-1, 1)
+
+    def encode_batch(self, values, offsets):
+        """
+        Returns the original column of all the cases of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Original column
+        :rtype: np.ndarray
+        """
+        return np.where(values[self.column_id] == 1, "True", "False").reshape(-1, 1)
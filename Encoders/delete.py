@@ -31,6 +31,19 @@ class DeleteEncoder(SingleColumnEncoder):
         """
         return case[0, self.column_id]
 
+    def get_leftover_batch(self, values, offsets):
+        """
+        Returns the first element of the deleted column for every case of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: First element of the deleted column of each case
+        :rtype: np.ndarray
+        """
+        return as_object_column(values[self.column_id][offsets[:-1]])
+
 
 class DeleteDecoder(SingleColumnEncoder):
     def __init__(self, input_column_names, input_column_ids, output_column_names, output_column_ids, properties):
@@ -75,5 +88,21 @@ class DeleteDecoder(SingleColumnEncoder):
         self.data_counter += 1
         return result
 
+    def encode_batch(self, values, offsets):
+        """
+        Returns the original column of all the cases of a batch, taking one leftover per case
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Original column
+        :rtype: np.ndarray
+        """
+        lengths = np.diff(offsets)
+        data = np.asarray(self.data[self.data_counter:self.data_counter + len(lengths)], dtype=object)
+        self.data_counter += len(lengths)
+        return np.repeat(data, lengths).reshape(-1, 1)
+
     def encode_single_result(self, input, output, leftover):
         return leftover
@@ -23,10 +23,16 @@ class NormalizeEncoder(SingleColumnEncoder):
         self.max = 0
         self.uninitialized = True
 
-    def update_encoder(self, chunk):
+    def get_partial_state(self, chunk):
         values = chunk[self.column_name].to_numpy()
-        min_chunk = min(values)
-        max_chunk = max(values)
+        if len(values) == 0:
+            return None
+        return min(values), max(values)
+
+    def merge(self, partial_state):
+        if partial_state is None:
+            return
+        min_chunk, max_chunk = partial_state
         if self.uninitialized:
             self.min = min_chunk
             self.max = max_chunk
@@ -47,12 +53,24 @@ class NormalizeEncoder(SingleColumnEncoder):
         :return: Encoded column
         :rtype: np.ndarray
         """
+        return self.encode_batch([case[:, i] for i in range(case.shape[1])], [0, len(case)])
+
+    def encode_batch(self, values, offsets):
+        """
+        Normalizes the data of all the cases of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Encoded column
+        :rtype: np.ndarray
+        """
+        column = values[self.column_id].astype(float)
         # Replace Not a Number (NaN) with 0
-        nans = np.argwhere(np.isnan(case[:, self.column_id].astype(float)))
-        case[:, self.column_id] = np.nan_to_num(case[:, self.column_id])
-        case[:, self.column_id] = (case[:, self.column_id] - self.min) / (self.max - self.min)
-        case[nans, self.column_id] = 0
-        return case[:, self.column_id].reshape(-1, 1)
+        result = (column - self.min) / (self.max - self.min)
+        result[np.isnan(column)] = 0
+        return result.reshape(-1, 1)
 
     def set_properties(self, properties):
         self.min = float(properties[0])
@@ -94,3 +112,16 @@ class NormalizeDecoder(SingleColumnEncoder):
         :rtype: np.ndarray
         """
         return ((case[:, self.column_id] * (self.max - self.min)) + self.min).reshape(-1, 1)
+
+    def encode_batch(self, values, offsets):
+        """
+        Returns the original values, not normalized, of the column of all the cases of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Array of the not normalized values
+        :rtype: np.ndarray
+        """
+        return ((np.asarray(values[self.column_id]) * (self.max - self.min)) + self.min).reshape(-1, 1)
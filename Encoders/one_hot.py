@@ -20,8 +20,11 @@ class OneHotEncoder(SingleColumnEncoder):
         :type activity: bool
         """
         super().__init__("OneHot", ColumnType.QUALITATIVE, column_id)
+        self.output_dtype = np.int8
         self.encoding = {}
         self.unique_values = np.empty([0])
+        self.sorted_values = np.empty([0], dtype=str)
+        self.sorted_codes = np.empty([0], dtype=np.int64)
         self.values_set = set()
         self.activity = activity
         if self.activity:
@@ -30,16 +33,56 @@ class OneHotEncoder(SingleColumnEncoder):
     def tamper(self, activities_to_add):
         self.activities_to_add = activities_to_add
 
-    def update_encoder(self, chunk):
-        self.values_set.update(set(chunk[self.column_name].astype(str).unique()))
+    def get_partial_state(self, chunk):
+        return set(chunk[self.column_name].astype(str).unique())
+
+    def merge(self, partial_state):
+        self.values_set.update(partial_state)
 
     def finalize(self):
         self.unique_values = np.sort(list(self.values_set))
         if self.activity:
             self.unique_values = np.hstack((np.sort(list(self.activities_to_add)), self.unique_values))
         self.encoding = dict(zip(self.unique_values, range(len(self.unique_values))))
+        self.set_sorted_values()
         self.output_column_names = self.unique_values
 
+    def set_sorted_values(self):
+        """
+        Sorts the unique values once, so that a whole column can be converted into codes with a binary search. The
+        unique values themselves are not always sorted (the activities added by the editors come first)
+
+        """
+        self.sorted_codes = np.argsort(self.unique_values, kind='stable')
+        self.sorted_values = self.unique_values[self.sorted_codes].astype(str)
+
+    def get_codes(self, column):
+        """
+        Converts a column into the indexes of its values inside the unique values. Empty values get the code -1
+
+        :param column: Column to convert
+        :type column: np.ndarray
+        :return: Code of each value
+        :rtype: np.ndarray
+        """
+        column = np.asarray(column)
+        empty = column == ""
+        if column.dtype == object:
+            empty |= pd.isna(column)
+        values = column.astype(str)
+        codes = np.full(len(column), -1, dtype=np.int64)
+        if len(self.sorted_values) > 0:
+            positions = np.minimum(np.searchsorted(self.sorted_values, values), len(self.sorted_values) - 1)
+            found = self.sorted_values[positions] == values
+            codes[found] = self.sorted_codes[positions[found]]
+        else:
+            found = np.zeros(len(column), dtype=bool)
+        unknown = ~found & ~empty
+        if unknown.any():
+            raise KeyError(str(values[unknown][0]))
+        codes[empty] = -1
+        return codes
+
     def encode_case(self, case):
         """
         Encodes the case according to the encoder internal representation
@@ -49,17 +92,20 @@ class OneHotEncoder(SingleColumnEncoder):
         :return: Column of the case with all values replaced by the corresponding "one-hot" vector
         :rtype: np.ndarray
         """
-        column = case[:, self.column_id]
-        one_hot = np.zeros((len(column), len(self.unique_values)), dtype=np.int8)
-        nan_indexes = set(np.where(column == "")[0].tolist())
-        oh_indexes = np.array([self.encoding[str(value)] for value in column if value is not None])
-        if len(nan_indexes) == 0:
-            oh_rows = np.arange(len(oh_indexes))
-        else:
-            oh_rows = np.asarray([i for i in range(len(column)) if i not in nan_indexes])
-        if len(oh_rows) > 0:
-            one_hot[oh_rows, oh_indexes] = 1
-        return one_hot
+        return self.encode_column(case[:, self.column_id])
+
+    def encode_batch(self, values, offsets):
+        """
+        Encodes all the cases of a batch according to the encoder internal representation
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Column of the batch with all values replaced by the corresponding "one-hot" vector
+        :rtype: np.ndarray
+        """
+        return self.encode_column(values[self.column_id])
 
     def encode_single(self, input):
         one_hot = np.zeros((len(self.unique_values)), dtype=np.int8)
@@ -68,14 +114,10 @@ class OneHotEncoder(SingleColumnEncoder):
 
     def encode_column(self, column):
         one_hot = np.zeros((len(column), len(self.unique_values)), dtype=np.int8)
-        nan_indexes = set(np.where(column == "")[0].tolist())
-        oh_indexes = np.array([self.encoding[str(value)] for value in column if value is not None])
-        if len(nan_indexes) == 0:
-            oh_rows = np.arange(len(oh_indexes))
-        else:
-            oh_rows = np.asarray([i for i in range(len(column)) if i not in nan_indexes])
-        if len(oh_rows) > 0:
-            one_hot[oh_rows, oh_indexes] = 1
+        codes = self.get_codes(column)
+        # Empty values stay as a vector of zeros
+        oh_rows = np.flatnonzero(codes >= 0)
+        one_hot[oh_rows, codes[oh_rows]] = 1
         return one_hot
 
     def get_properties(self):
@@ -84,6 +126,7 @@ class OneHotEncoder(SingleColumnEncoder):
     def set_properties(self, properties):
         self.unique_values = np.asarray(properties)
         self.encoding = dict(zip(self.unique_values, range(len(self.unique_values))))
+        self.set_sorted_values()
         self.output_column_names = self.unique_values
 
 
@@ -133,9 +176,120 @@ class OneHotDecoder(MultiColumnEncoder):
         result = result.reshape(-1, 1)
         return result
 
+    def encode_batch(self, values, offsets):
+        """
+        Decodes all the cases of a batch at once, as they are decoded event by event
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Column of the batch with all original values
+        :rtype: np.ndarray
+        """
+        return self.encode_case(np.column_stack(values))
+
     def encode_single_result(self, input, output, leftover):
         return self.unique_values[np.argmax(output[self.column_ids[0]:self.column_ids[1] + 1], axis=0)]
 
     def encode_list(self, list):
         return self.unique_values[np.argmax(list, axis=1)]
 
+    def encode_top_k(self, probabilities, k=1):
+        """
+        Returns the k most probable values of every row of a matrix of probabilities (such as the outputs of a neural
+        network), from the most to the least probable. Only the k best values of a row are sorted
+
+        :param probabilities: Probability of every value, one row per prediction
+        :type probabilities: np.ndarray
+        :param k: Number of values to return per row
+        :type k: int
+        :return: The k best values of every row, and their probabilities
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        probabilities = np.asarray(probabilities)
+        k = min(k, probabilities.shape[1])
+        best_ids = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+        best_probabilities = np.take_along_axis(probabilities, best_ids, axis=1)
+        order = np.argsort(-best_probabilities, axis=1, kind='stable')
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        return self.unique_values[best_ids], np.take_along_axis(best_probabilities, order, axis=1)
+
+
+class OneHotIndexEncoder(OneHotEncoder):
+
+    def __init__(self, column_id, activity=False) -> None:
+        """
+        Encoder that stores the index of a qualitative value instead of its "one-hot" vector, inside a single int32
+        column. The index starts at 1: 0 is kept for empty values and padding. The "one-hot" vectors are only built when
+        needed, inside the batches or the neural network
+
+        :param column_id: Index of the column to process
+        :type column_id: int
+        :param activity: Defines if this encoder is processing activities (hence can be modified by the editor manager)
+        :type activity: bool
+        """
+        super().__init__(column_id, activity)
+        self.name = "OneHotIndex"
+        self.output_dtype = np.int32
+
+    def finalize(self):
+        super().finalize()
+        self.output_column_names = np.asarray([self.name + "_" + str(self.column_id)])
+
+    def encode_single(self, input):
+        return np.asarray([self.encoding[str(input)] + 1], dtype=np.int32)
+
+    def encode_column(self, column):
+        return (self.get_codes(column) + 1).astype(np.int32).reshape(-1, 1)
+
+    def set_properties(self, properties):
+        super().set_properties(properties)
+        self.output_column_names = np.asarray([self.name + "_" + str(self.column_id)])
+
+
+class OneHotIndexDecoder(OneHotDecoder):
+
+    def __init__(self, input_column_names, input_column_ids, output_column_names, output_column_ids,
+                 properties) -> None:
+        """
+        Decoder that converts the index of a qualitative value (starting at 1, 0 being an empty value) into the value
+
+        :param input_column_names: Names of the input columns
+        :type input_column_names: list
+        :param input_column_ids: Indexes of the input columns
+        :type input_column_ids: list
+        :param output_column_names: Names of the output columns
+        :type output_column_names: list
+        :param output_column_ids: Indexes of the output columns
+        :type output_column_ids: list
+        """
+        super().__init__(input_column_names, input_column_ids, output_column_names, output_column_ids, properties)
+        self.name = "OneHotIndex"
+
+    def encode_case(self, case):
+        """
+        Decodes the case according to the encoder internal representation
+
+        :param case: Case to process
+        :type case: np.ndarray
+        :return: Column of the case with all original values
+        :rtype: np.ndarray
+        """
+        values = np.append("", self.unique_values).astype(object)
+        result = values[case[:, self.column_ids[0]].astype(int)]
+        return result.reshape(-1, 1)
+
+    def encode_single_result(self, input, output, leftover):
+        return np.append("", self.unique_values)[int(output[self.column_ids[0]])]
+
+    def to_one_hot_decoder(self):
+        """
+        Creates the "one-hot" decoder of the same values, reading the first columns of its input. Used to decode the
+        outputs of a neural network, that are probabilities and not indexes
+
+        :return: "One-hot" decoder
+        :rtype: OneHotDecoder
+        """
+        return OneHotDecoder(self.unique_values, [0, len(self.unique_values) - 1], self.column_names, [],
+                             self.unique_values)
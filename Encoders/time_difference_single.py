@@ -25,26 +25,42 @@ class TimeDifferenceSingleEncoder(SingleColumnEncoder):
         self.previous_date = None
         self.previous_id = None
 
-    def update_encoder(self, chunk):
+    def get_partial_state(self, chunk):
         """
-        Updates the internal representation of the encoder
+        Computes the maximum difference between two dates of a same case inside the chunk. The first and last events
+        of the chunk are kept, to stitch the chunk with the previous one
 
         :param chunk: Chunk to process (here, a chunk of a file)
         :type chunk: pd.DataFrame
-        """
-        if self.previous_id:
-            dates = np.hstack(([self.previous_date], chunk[self.column_name]))
-            ids = np.hstack(([self.previous_id], chunk[self.cid_column_name]))
-        else:
-            dates = chunk[self.column_name].to_numpy()
-            ids = chunk[self.cid_column_name].to_numpy()
-        dates_difference = dates[1:] - dates[:-1]
-        dates_difference = (dates_difference / 1000000000).astype(int)
-        dates_filter = np.array([i == j for i, j in zip(ids[1:], ids[:-1])])
-        dates_difference = dates_difference * dates_filter
-        self.max = max(self.max, dates_difference.max())
-        self.previous_date = dates[-1]
-        self.previous_id = ids[-1]
+        :return: Maximum difference, first case ID and date, last case ID and date
+        :rtype: (int, Any, int, Any, int)
+        """
+        dates = self.get_nanoseconds(chunk[self.column_name].to_numpy())
+        ids = chunk[self.cid_column_name].to_numpy()
+        if len(dates) == 0:
+            return None
+        dates_difference = (np.diff(dates) / 1000000000).astype(int)
+        # Only the differences inside a same case are considered
+        dates_difference[ids[1:] != ids[:-1]] = 0
+        max_difference = int(dates_difference.max()) if len(dates_difference) > 0 else 0
+        return max_difference, ids[0], dates[0], ids[-1], dates[-1]
+
+    def merge(self, partial_state):
+        """
+        Merges the partial state of a chunk: the difference between the last date of the previous chunk and the first
+        date of this chunk is considered if they belong to the same case
+
+        :param partial_state: Partial state of a chunk
+        :type partial_state: (int, Any, int, Any, int)
+        """
+        if partial_state is None:
+            return
+        max_difference, first_id, first_date, last_id, last_date = partial_state
+        self.max = max(self.max, max_difference)
+        if self.previous_id is not None and self.previous_id == first_id:
+            self.max = max(self.max, int((first_date - self.previous_date) / 1000000000))
+        self.previous_date = last_date
+        self.previous_id = last_id
 
     def get_properties(self):
         """
@@ -53,6 +69,32 @@ class TimeDifferenceSingleEncoder(SingleColumnEncoder):
         """
         return [self.max]
 
+    @staticmethod
+    def get_nanoseconds(column):
+        """
+        Converts a column of dates into a number of nanoseconds since the epoch, whatever the unit of the dates
+
+        :param column: Column of dates (either typed or Timestamps)
+        :type column: np.ndarray
+        :return: Number of nanoseconds of each date
+        :rtype: np.ndarray
+        """
+        if not np.issubdtype(column.dtype, np.datetime64):
+            column = pd.to_datetime(column)
+        return np.asarray(column, dtype="datetime64[ns]").view(np.int64)
+
+    @staticmethod
+    def get_seconds(column):
+        """
+        Converts a column of dates into a number of seconds since the epoch
+
+        :param column: Column of dates (either typed or Timestamps)
+        :type column: np.ndarray
+        :return: Number of seconds of each date
+        :rtype: np.ndarray
+        """
+        return (TimeDifferenceSingleEncoder.get_nanoseconds(column) / 1000000000).astype(int)
+
     def encode_case(self, case):
         """
         Encodes the case's date: computes the difference between a date and its previous one
@@ -62,10 +104,25 @@ class TimeDifferenceSingleEncoder(SingleColumnEncoder):
         :return: Array of the encoded dates
         :rtype: np.ndarray
         """
-        dates = np.asarray([x.value for x in case[:, self.column_id]])
-        dates = (dates / 1000000000).astype(int)
-        dates_difference = np.append(0, dates[1:] - dates[:-1]).reshape(-1, 1) / self.max
-        return dates_difference
+        return self.encode_batch([case[:, i] for i in range(case.shape[1])], [0, len(case)])
+
+    def encode_batch(self, values, offsets):
+        """
+        Encodes the dates of all the cases of a batch: computes the difference between a date and its previous one
+        inside the same case
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Array of the encoded dates
+        :rtype: np.ndarray
+        """
+        dates = self.get_seconds(values[self.column_id])
+        dates_difference = np.diff(dates, prepend=dates[:1])
+        # The first event of a case has no previous date
+        dates_difference[offsets[:-1]] = 0
+        return dates_difference.reshape(-1, 1) / self.max
 
     def get_leftover(self, case):
         """
@@ -78,6 +135,19 @@ class TimeDifferenceSingleEncoder(SingleColumnEncoder):
         """
         return case[0, self.column_id]
 
+    def get_leftover_batch(self, values, offsets):
+        """
+        Returns the first date of every case of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: First date of each case
+        :rtype: np.ndarray
+        """
+        return as_object_column(values[self.column_id][offsets[:-1]])
+
     def set_properties(self, properties):
         self.max = int(properties[0])
 
@@ -136,21 +206,45 @@ class TimeDifferenceSingleDecoder(SingleColumnEncoder):
         :return: Array of the decoded dates
         :rtype: np.ndarray
         """
-        start_date = np.datetime64(self.first_dates[self.date_counter])
-        self.date_counter += 1
-        result = [start_date]
-        for i in range(1, len(case)):
-            difference = np.timedelta64(int(case[i, self.column_id] * self.max), 's')
-            new_date = result[i - 1] + difference
-            result.append(new_date)
-        result = np.reshape(np.asarray(result, dtype=object), (-1, 1))
-        return result
+        return self.encode_batch([case[:, i] for i in range(case.shape[1])], [0, len(case)])
+
+    def get_seconds(self, column):
+        """
+        Converts encoded differences into numbers of seconds, truncated as integers
+
+        :param column: Encoded differences
+        :type column: np.ndarray
+        :return: Differences in seconds
+        :rtype: np.ndarray
+        """
+        return (np.asarray(column, dtype=float) * self.max).astype(np.int64)
+
+    def encode_batch(self, values, offsets):
+        """
+        Decodes the dates of all the cases of a batch, with a cumulative sum of the differences starting from the first
+        date of each case (taken from the leftovers, in the order of the cases)
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Array of the decoded dates
+        :rtype: np.ndarray
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        case_counter = len(offsets) - 1
+        lengths = np.diff(offsets)
+        first_dates = np.asarray(self.first_dates[self.date_counter:self.date_counter + case_counter],
+                                 dtype="datetime64[us]")
+        self.date_counter += case_counter
+        differences = self.get_seconds(values[self.column_id])
+        # The first event of a case is its start date
+        differences[offsets[:-1]] = 0
+        elapsed = np.cumsum(differences)
+        elapsed -= np.repeat(elapsed[offsets[:-1]], lengths)
+        result = np.repeat(first_dates, lengths) + elapsed.astype("timedelta64[s]")
+        return result.reshape(-1, 1)
 
     def encode_single_result(self, input, output, leftover):
-        new_date = np.datetime64(leftover)
-        for i in range(1, len(input)):
-            difference = np.timedelta64(int(input[i, self.column_id] * self.max), 's')
-            new_date += difference
-        difference = np.timedelta64(int(output[self.column_id] * self.max), 's')
-        new_date += difference
-        return new_date
+        difference = self.get_seconds(input[1:, self.column_id]).sum() + self.get_seconds(output[self.column_id])
+        return np.datetime64(leftover, 'us') + np.timedelta64(int(difference), 's')
@@ -0,0 +1,75 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import csv
+import filecmp
+import shutil
+
+from Managers.common_functions import *
+from Managers.encoder_manager import *
+from Managers.log_cache import LogCache
+from Editors import *
+from Encoders import *
+
+
+def encode(input_path, output_name, use_cache):
+    """
+    Builds an orchestrator (with automatic co-variable encoders) and encodes the whole file
+
+    :param input_path: Path of the input file
+    :type input_path: str
+    :param output_name: Name of the output folder
+    :type output_name: str
+    :param use_cache: Defines if the file is read from its binary columnar cache (built if needed)
+    :type use_cache: bool
+    """
+    encoders = [DeleteEncoder(0), OneHotEncoder(1, activity=True), TimeDifferenceSingleEncoder(2)]
+    encoders += auto_cov_encoders(input_path, input_chunk_size, 3, use_cache, dates_ids=dates_ids)
+    orchestrator = build_orchestrator(input_path, output_name, input_chunk_size, EncoderManager(encoders),
+                                      EditorManager([SosForAll(), EosForAll()]), dates_ids, double_timestamps,
+                                      use_cache)
+    orchestrator.save_to_file()
+    orchestrator.process_offline(input_chunk_size)
+
+
+def read_description(output_name):
+    # The name of the output folder is the only expected difference
+    with open("Output/" + output_name + "/desc_data.csv", 'r') as input_file:
+        return [row for i, row in enumerate(csv.reader(input_file)) if i != 1]
+
+
+def check_cache(filename):
+    """
+    Encodes a file without cache, while building its cache, and from its cache, and checks that the encoder properties
+    and the encoded stores are the same
+
+    :param filename: Name of the dataset
+    :type filename: str
+    """
+    input_path = "./Data/" + filename + ".csv"
+    shutil.rmtree(LogCache(input_path, dates_ids).folder, ignore_errors=True)
+    output_names = [filename + "_no_cache", filename + "_cold_cache", filename + "_warm_cache"]
+    for output_name, use_cache in zip(output_names, [False, True, True]):
+        encode(input_path, output_name, use_cache)
+    print("The cache is used:", LogCache(input_path, dates_ids).is_valid(input_chunk_size))
+    for output_name in output_names[1:]:
+        same_properties = read_description(output_name) == read_description(output_names[0])
+        _, mismatches, errors = filecmp.cmpfiles("Output/" + output_names[0], "Output/" + output_name,
+                                                 ["data_header.csv", "data_offsets.bin", "data_values.bin"],
+                                                 shallow=False)
+        print(output_name, "- same properties:", same_properties, "- same store:", not mismatches and not errors)
+
+
+# First, if you haven't done so, please unzip Data.zip to the root of the project.
+
+
+if __name__ == '__main__':
+    filename = "helpdesk"
+    input_chunk_size = 5000
+    double_timestamps = False
+    dates_ids = [2]
+    check_cache(filename)
@@ -0,0 +1,78 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import json
+import threading
+import urllib.request
+
+import pandas as pd
+
+from Managers.common_functions import *
+from Managers.encoder_manager import *
+from Editors import *
+from Encoders import *
+from DataPreparators import *
+from Trainers import *
+from Predictors import *
+
+
+def post(port, path, body):
+    request = urllib.request.Request("http://localhost:" + str(port) + path, data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def smoke_test(filename, bucket_bounds, port):
+    """
+    Starts a prediction server with an untrained model, and checks that it answers to a prefix and to the events of a
+    running case
+
+    :param filename: Name of the dataset
+    :type filename: str
+    :param bucket_bounds: Bounds of the buckets of the preparator (None for a single bucket)
+    :type bucket_bounds: list
+    :param port: Port of the server
+    :type port: int
+    """
+    input_path = "./Data/" + filename + ".csv"
+    encoders = [DeleteEncoder(0), OneHotEncoder(1, activity=True), TimeDifferenceSingleEncoder(2)]
+    orchestrator = build_orchestrator(input_path, filename, input_chunk_size, EncoderManager(encoders),
+                                      EditorManager([SosForAll(), EosForAll()]), dates_ids, double_timestamps)
+    preparator = NextActivity(bucket_bounds=bucket_bounds)
+    preparator.build(input_chunk_size, output_chunk_size, batch_size, orchestrator)
+    lstm_trainer = LSTMTrainer()
+    lstm_trainer.build(preparator, 1)
+    lstm_trainer.model = lstm_trainer.core()[0]
+    server = PredictionServer(lstm_trainer)
+    thread = threading.Thread(target=server.serve, kwargs={"port": port})
+    thread.start()
+    server.ready.wait()
+    try:
+        events = pd.read_csv(input_path, nrows=20).astype(object).values.tolist()
+        # A short prefix, then a long one (the first rows of the file) padded to the largest bucket
+        print(post(port, "/predict", {"events": events[:2]}))
+        print(post(port, "/predict", {"events": events}))
+        for event in events[:3]:
+            print(post(port, "/advance", {"case_id": str(event[0]), "event": event}))
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+# First, if you haven't done so, please unzip Data.zip to the root of the project.
+
+
+if __name__ == '__main__':
+    filename = "helpdesk"
+    input_chunk_size = 5000
+    output_chunk_size = 5000
+    batch_size = 64
+    double_timestamps = False
+    dates_ids = [2]
+    smoke_test(filename, None, 8000)
+    smoke_test(filename, [3, 5, 8], 8001)
@@ -0,0 +1,275 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ChunkIndex:
+
+    def __init__(self, input_path, input_chunk_size) -> None:
+        """
+        Index of the chunks of an input file. For each chunk, it stores its byte offset and size inside the file. It is
+        built once, while analyzing the file, and then used to seek directly to the chunks instead of counting them
+        again
+
+        :param input_path: Name of the indexed file
+        :type input_path: str
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        """
+        self.input_path = input_path
+        self.input_chunk_size = input_chunk_size
+        file_stat = os.stat(input_path)
+        self.file_size = file_stat.st_size
+        self.file_mtime = file_stat.st_mtime
+        self.offsets = []
+        self.sizes = []
+
+    def add_chunk(self, offset, size):
+        """
+        Adds a chunk to the index
+
+        :param offset: Byte offset of the chunk inside the file
+        :type offset: int
+        :param size: Size of the chunk, in bytes
+        :type size: int
+        """
+        self.offsets.append(offset)
+        self.sizes.append(size)
+
+    def get_chunk_counter(self):
+        """
+        Returns the total number of chunks of the indexed file
+
+        :return: Number of chunks
+        :rtype: int
+        """
+        return len(self.offsets)
+
+    def is_valid(self, input_path, input_chunk_size):
+        """
+        Checks if the index can be used to read a file: it must be the same, unmodified file, read with the same chunk
+        size
+
+        :param input_path: Name of the file to read
+        :type input_path: str
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: True if the index matches the file
+        :rtype: bool
+        """
+        if input_path != self.input_path or input_chunk_size != self.input_chunk_size:
+            return False
+        if not os.path.exists(input_path):
+            return False
+        file_stat = os.stat(input_path)
+        return file_stat.st_size == self.file_size and file_stat.st_mtime == self.file_mtime
+
+    def save_to_file(self, output_name):
+        """
+        Saves the index next to the description of the orchestrator
+
+        :param output_name: Name of the output folder
+        :type output_name: str
+        """
+        with open("Output/" + output_name + "/index_data.csv", 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(["Name of the input file", self.input_path])
+            writer.writerow(["Size of the input file", self.file_size])
+            writer.writerow(["Modification time of the input file", repr(self.file_mtime)])
+            writer.writerow(["Size of a chunk", self.input_chunk_size])
+            writer.writerow(["Offset", "Size"])
+            writer.writerows(zip(self.offsets, self.sizes))
+
+    @staticmethod
+    def load_from_file(output_name):
+        """
+        Loads the index of an output folder, if it exists
+
+        :param output_name: Name of the output folder
+        :type output_name: str
+        :return: The index, or None if there is none
+        :rtype: ChunkIndex
+        """
+        index_path = "Output/" + output_name + "/index_data.csv"
+        if not os.path.exists(index_path):
+            return None
+        chunk_index = ChunkIndex.__new__(ChunkIndex)
+        with open(index_path, 'r') as input_file:
+            reader = csv.reader(input_file)
+            chunk_index.input_path = next(reader)[1]
+            chunk_index.file_size = int(next(reader)[1])
+            chunk_index.file_mtime = float(next(reader)[1])
+            chunk_index.input_chunk_size = int(next(reader)[1])
+            _ = next(reader)
+            rows = list(reader)
+        chunk_index.offsets = [int(row[0]) for row in rows]
+        chunk_index.sizes = [int(row[1]) for row in rows]
+        return chunk_index
+
+
+def flag_last(iterable):
+    """
+    Iterates over the elements, and tells for each one if it is the last one. Only one element is read in advance
+
+    :param iterable: Elements to iterate over
+    :type iterable: Iterable
+    :return: Generator of (element, is it the last element)
+    :rtype: Generator
+    """
+    iterator = iter(iterable)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield current, False
+        current = following
+    yield current, True
+
+
+def read_column_names(input_path):
+    """
+    Reads the names of the columns of a CSV file
+
+    :param input_path: Name of the file to read
+    :type input_path: str
+    :return: Names of the columns
+    :rtype: pd.Index
+    """
+    return pd.read_csv(input_path, nrows=0).columns
+
+
+def read_raw_chunks(input_path, input_chunk_size, block_size=1 << 24):
+    """
+    Cuts a CSV file into raw chunks of lines, without parsing them. Only the newlines and the quotes are searched, so it
+    is much faster than reading the file with pandas. A newline inside a quoted value does not end a line. The header
+    and the chunks made only of blank lines are skipped
+
+    :param input_path: Name of the file to read
+    :type input_path: str
+    :param input_chunk_size: Maximum number of lines stored inside a chunk
+    :type input_chunk_size: int
+    :param block_size: Number of bytes read from the disk at once
+    :type block_size: int
+    :return: Generator of (byte offset of the chunk, raw content of the chunk)
+    :rtype: Generator
+    """
+    with open(input_path, 'rb') as input_file:
+        input_file.readline()
+        offset = input_file.tell()
+        buffer = b''
+        newlines = np.empty(0, dtype=np.int64)
+        # Defines if the bytes read so far end inside a quoted value
+        inside_quotes = False
+        end_of_file = False
+        while True:
+            blocks = [buffer]
+            buffer_size = len(buffer)
+            while len(newlines) < input_chunk_size and not end_of_file:
+                block = input_file.read(block_size)
+                if not block:
+                    end_of_file = True
+                    break
+                block_bytes = np.frombuffer(block, dtype=np.uint8)
+                new_lines = np.flatnonzero(block_bytes == ord('\n'))
+                quotes = np.flatnonzero(block_bytes == ord('"'))
+                if len(quotes) > 0 or inside_quotes:
+                    # A newline ends a line only after an even number of quotes (escaped quotes are doubled)
+                    quote_counters = np.searchsorted(quotes, new_lines) + inside_quotes
+                    new_lines = new_lines[quote_counters % 2 == 0]
+                    inside_quotes = (len(quotes) + inside_quotes) % 2 == 1
+                newlines = np.concatenate((newlines, new_lines + buffer_size))
+                blocks.append(block)
+                buffer_size += len(block)
+            buffer = b''.join(blocks)
+            if len(newlines) >= input_chunk_size:
+                end = int(newlines[input_chunk_size - 1]) + 1
+                newlines = newlines[input_chunk_size:] - end
+            else:
+                end = len(buffer)
+                newlines = np.empty(0, dtype=np.int64)
+            raw_chunk = buffer[:end]
+            buffer = buffer[end:]
+            if raw_chunk.strip():
+                yield offset, raw_chunk
+            offset += end
+            if end_of_file and not buffer:
+                break
+
+
+def parse_raw_chunk(raw_chunk, column_names, dates_ids):
+    """
+    Parses a raw chunk of lines of a CSV file
+
+    :param raw_chunk: Raw content of the chunk, without header
+    :type raw_chunk: bytes
+    :param column_names: Names of the columns of the file
+    :type column_names: list
+    :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
+    :type dates_ids: list
+    :return: Parsed chunk
+    :rtype: pd.DataFrame
+    """
+    return pd.read_csv(io.BytesIO(raw_chunk), header=None, names=list(column_names),
+                       parse_dates=dates_ids if dates_ids else False)
+
+
+def read_chunks(input_path, input_chunk_size, column_names, dates_ids):
+    """
+    Reads a CSV file by chunks, without any index
+
+    :param input_path: Name of the file to read
+    :type input_path: str
+    :param input_chunk_size: Maximum number of lines stored inside a chunk
+    :type input_chunk_size: int
+    :param column_names: Names of the columns of the file
+    :type column_names: list
+    :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
+    :type dates_ids: list
+    :return: Generator of (chunk, is it the last chunk)
+    :rtype: Generator
+    """
+    for (_, raw_chunk), last_chunk in flag_last(read_raw_chunks(input_path, input_chunk_size)):
+        yield parse_raw_chunk(raw_chunk, column_names, dates_ids), last_chunk
+
+
+def read_indexed_raw_chunks(chunk_index):
+    """
+    Reads the raw chunks of a CSV file, seeking each chunk from its byte offset
+
+    :param chunk_index: Index of the file
+    :type chunk_index: ChunkIndex
+    :return: Generator of (byte offset of the chunk, raw content of the chunk)
+    :rtype: Generator
+    """
+    with open(chunk_index.input_path, 'rb') as input_file:
+        for chunk_id in range(chunk_index.get_chunk_counter()):
+            input_file.seek(chunk_index.offsets[chunk_id])
+            yield chunk_index.offsets[chunk_id], input_file.read(chunk_index.sizes[chunk_id])
+
+
+def read_indexed_chunks(chunk_index, column_names, dates_ids):
+    """
+    Reads a CSV file by chunks, seeking each chunk from its byte offset
+
+    :param chunk_index: Index of the file
+    :type chunk_index: ChunkIndex
+    :param column_names: Names of the columns of the file
+    :type column_names: list
+    :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
+    :type dates_ids: list
+    :return: Generator of (chunk, is it the last chunk)
+    :rtype: Generator
+    """
+    for (_, raw_chunk), last_chunk in flag_last(read_indexed_raw_chunks(chunk_index)):
+        yield parse_raw_chunk(raw_chunk, column_names, dates_ids), last_chunk
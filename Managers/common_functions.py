@@ -11,13 +11,16 @@ from tqdm import tqdm
 
 from Encoders import *
 from generic_functions import *
+from Managers.chunk_index import ChunkIndex
 from Managers.editor_manager import EditorManager
+from Managers.encoded_store import EncodedStore
 from Managers.encoder_manager import EncoderManager
+from Managers.log_cache import LogCache
 from Managers.orchestrator import Orchestrator
 
 
 def build_orchestrator(input_path, output_name, input_chunk_size, encoder_manager, editor_manager=None, dates_ids=None,
-                       double_timestamps=False):
+                       double_timestamps=False, use_cache=False, workers=1):
     """
     Builds and initializes an orchestrator from a (either data or cov) file
 
@@ -35,11 +38,17 @@ def build_orchestrator(input_path, output_name, input_chunk_size, encoder_manage
     :type dates_ids: list
     :param double_timestamps: Defines if the file had two timestamps (only used for data files)
     :type double_timestamps: bool
+    :param use_cache: Defines if the parsed file is stored inside a binary columnar cache, read afterwards instead of
+    the file
+    :type use_cache: bool
+    :param workers: Number of processes analyzing the file at the same time
+    :type workers: int
     """
     orchestrator = Orchestrator(encoder_manager, editor_manager)
     orchestrator.alter_encoders_descriptions()
     # Read the whole file once, to get all the information needed for the encoders
-    orchestrator.init_from_data(input_path, output_name, input_chunk_size, double_timestamps, dates_ids)
+    orchestrator.init_from_data(input_path, output_name, input_chunk_size, double_timestamps, dates_ids, use_cache,
+                                workers)
     orchestrator.alter_internal_infos()
     return orchestrator
 
@@ -86,12 +95,20 @@ def load_orchestrator_from_file(output_name):
         encoder.set_properties(properties)
         encoder.set_column_names(column_names)
         encoders.append(encoder)
+    # Files saved by older versions do not have the histogram of the lengths of the cases
+    histogram_row = next(reader, None)
+    length_histogram = np.asarray(histogram_row[1:], dtype=np.int64) if histogram_row else None
     encoder_manager = EncoderManager(encoders)
     encoder_manager.set_all_output_column_names()
     editor_manager = EditorManager.create_from_names(editors_names)
     orchestrator = Orchestrator(encoder_manager, editor_manager)
     orchestrator.insert_infos(input_path, output_name, column_names, dates_ids, case_counter, total_chunk_counter,
-                              double_timestamps, activity_counter, max_case_length)
+                              double_timestamps, activity_counter, max_case_length, length_histogram)
+    orchestrator.chunk_index = ChunkIndex.load_from_file(output_name)
+    # Use the cache of the input file, if it was built and is still up to date
+    log_cache = LogCache(input_path, dates_ids)
+    if log_cache.is_valid():
+        orchestrator.log_cache = log_cache
     return orchestrator
 
 
@@ -160,7 +177,7 @@ def create_all_decoders(orchestrator):
     return decoder_manager
 
 
-def auto_cov_encoders(input_path, input_chunk_size, skip=0):
+def auto_cov_encoders(input_path, input_chunk_size, skip=0, use_cache=False, one_hot_index=False, dates_ids=None):
     """
     Automatically generates a list of encoders according to the type of data stored inside each co-variables column
 
@@ -171,11 +188,23 @@ def auto_cov_encoders(input_path, input_chunk_size, skip=0):
     :param skip: Number of columns to skip, if the file has got colulmns of data that are not co-variables (such as case
     ID, activity, timestamp)
     :type skip: int
+    :param use_cache: Defines if the file is read from its binary columnar cache (built if needed)
+    :type use_cache: bool
+    :param one_hot_index: Defines if qualitative columns are stored as indexes instead of "one-hot" vectors
+    :type one_hot_index: bool
+    :param dates_ids: Indexes of the dates columns, the same as the ones given to the orchestrator (so that the cache
+    of the file is built once, and reused by the orchestrator)
+    :type dates_ids: list
     :return: List of generated encoders
     :rtype: list
     """
     cov_encoders = []
-    cov_list = sort_cov_for_all_file(input_path, input_chunk_size)
+    chunks = None
+    if use_cache:
+        log_cache = LogCache(input_path, dates_ids)
+        if log_cache.is_valid(input_chunk_size) or log_cache.build(input_chunk_size):
+            chunks = (chunk for chunk, _ in log_cache.read_chunks(input_chunk_size))
+    cov_list = sort_cov_for_all_file(input_path, input_chunk_size, dates_ids, chunks)
     # Add the encoders (here, one type for each column type)
     for index, column in enumerate(cov_list):
         if index < skip:
@@ -185,7 +214,10 @@ def auto_cov_encoders(input_path, input_chunk_size, skip=0):
         elif column == ColumnType.QUANTITATIVE:
             cov_encoders.append(NormalizeEncoder(index))
         elif column == ColumnType.QUALITATIVE:
-            cov_encoders.append(OneHotEncoder(index, activity=False))
+            if one_hot_index:
+                cov_encoders.append(OneHotIndexEncoder(index, activity=False))
+            else:
+                cov_encoders.append(OneHotEncoder(index, activity=False))
         elif column == ColumnType.BOOLEAN:
             cov_encoders.append(BooleanEncoder(index))
     return cov_encoders
@@ -208,50 +240,39 @@ def decode_offline(output_name, output_chunk_size):
     orchestrator = load_orchestrator_from_file(output_name)
     decoder_manager = create_all_decoders(orchestrator)
     if orchestrator.has_leftovers:
-        with open(leftover_filename + ".csv") as leftover_file:
-            reader = csv.reader(leftover_file)
-            leftover_columns = next(reader)
-    with open("Output/" + output_name + "/" + file_type + ".npy", 'rb') as input_file:
-        for chunk_index in tqdm(range(ceil(orchestrator.case_counter / output_chunk_size)), desc="Decode " + file_type):
-        # for chunk_index in range(ceil(orchestrator.case_counter / input_chunk_size)):
-            cases = []
-            # Compute the number of cases to get
-            # If it is the last chunk, there will be less cases left
-            if chunk_index == ceil(orchestrator.case_counter / output_chunk_size) - 1:
-                chunk_range = orchestrator.case_counter % output_chunk_size
-            # Else, the number of cases if equal of the size of a chunk
-            else:
-                chunk_range = output_chunk_size
-            # Add all the cases to a list
-            for c in range(chunk_range):
-                cases.append(np.load(input_file, allow_pickle=True))
-            if orchestrator.has_leftovers:
-                # Add additional info to every decoder, if needed (such as the start dates)
-                leftover_chunk = pd.read_csv(leftover_filename + ".csv", skiprows=(output_chunk_size * chunk_index) + 1,
-                                             nrows=chunk_range, header=None)
-                leftover_chunk.columns = leftover_columns
-                for encoder in decoder_manager.encoders:
-                    if encoder.leftover_name:
-                        info = leftover_chunk[encoder.leftover_name]
-                        encoder.set_leftover(info)
-            decoded_cases = []
-            for case in cases:
-                decoded_cases.append(decoder_manager.encode_case(case))
-            # Write the results!
-            # If we are in the first chunk, create a new file
-            if chunk_index == 0:
-                with open(decoded_filename + ".npy", 'wb') as output_file:
-                    for case in decoded_cases:
-                        np.save(output_file, case)
-                with open(decoded_filename + ".csv", 'w', newline='') as output_file:
-                    csv.writer(output_file).writerows([orchestrator.column_names])
-                    for case in decoded_cases:
-                        csv.writer(output_file).writerows(case.tolist())
-            # Else, append to this file
-            else:
-                with open(decoded_filename + ".npy", 'ab') as output_file:
-                    for case in decoded_cases:
-                        np.save(output_file, case)
-                with open(decoded_filename + ".csv", 'a', newline='') as output_file:
-                    for case in decoded_cases:
-                        csv.writer(output_file).writerows(case.tolist())
+        # The leftovers are read alongside the cases, by a single reader
+        leftover_chunks = pd.read_csv(leftover_filename + ".csv", chunksize=output_chunk_size)
+    encoded_store = EncodedStore(output_name, file_type).open_for_reading()
+    for chunk_index in tqdm(range(ceil(orchestrator.case_counter / output_chunk_size)), desc="Decode " + file_type):
+        # Compute the number of cases to get
+        # If it is the last chunk, there will be less cases left
+        chunk_range = min(output_chunk_size, orchestrator.case_counter - output_chunk_size * chunk_index)
+        # Get all the events of the chunk (without copy)
+        events, offsets = encoded_store.get_batch(output_chunk_size * chunk_index,
+                                                  output_chunk_size * chunk_index + chunk_range)
+        if orchestrator.has_leftovers:
+            # Add additional info to every decoder, if needed (such as the start dates)
+            leftover_chunk = next(leftover_chunks)
+            for encoder in decoder_manager.encoders:
+                if encoder.leftover_name:
+                    info = leftover_chunk[encoder.leftover_name].to_numpy()
+                    encoder.set_leftover(info)
+        # All the cases of the chunk are decoded at once, then cut back into cases
+        decoded_events = decoder_manager.decode_batch([events[:, i] for i in range(events.shape[1])], offsets)
+        decoded_cases = np.split(decoded_events, offsets[1:-1])
+        # Write the results!
+        # If we are in the first chunk, create a new file
+        if chunk_index == 0:
+            with open(decoded_filename + ".npy", 'wb') as output_file:
+                for case in decoded_cases:
+                    np.save(output_file, case)
+            with open(decoded_filename + ".csv", 'w', newline='') as output_file:
+                csv.writer(output_file).writerows([orchestrator.column_names])
+                csv.writer(output_file).writerows(decoded_events.tolist())
+        # Else, append to this file
+        else:
+            with open(decoded_filename + ".npy", 'ab') as output_file:
+                for case in decoded_cases:
+                    np.save(output_file, case)
+            with open(decoded_filename + ".csv", 'a', newline='') as output_file:
+                csv.writer(output_file).writerows(decoded_events.tolist())
@@ -0,0 +1,82 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import numpy as np
+import pandas as pd
+
+from Managers.chunk_index import read_column_names
+
+
+class CovariateReader:
+
+    def __init__(self, cov_path, input_chunk_size, max_lookahead=None) -> None:
+        """
+        Reads a co-variables file (one row per case, the first column being the case ID) alongside the cases. The file
+        is read once, by chunks, with a single cursor. The rows read in advance are kept in a buffer indexed by case ID
+        until their case is requested, so the rows do not have to be in the exact same order as the cases, and cases or
+        rows can be missing
+
+        :param cov_path: Path of the co-variables file
+        :type cov_path: str
+        :param input_chunk_size: Number of rows read at once
+        :type input_chunk_size: int
+        :param max_lookahead: Number of rows inside the buffer after which the file is not read anymore (by default,
+        ten chunks). When a case ID is not found, the file is read until this limit is reached
+        :type max_lookahead: int
+        """
+        self.cov_path = cov_path
+        self.max_lookahead = max_lookahead if max_lookahead else 10 * input_chunk_size
+        self.column_names = read_column_names(cov_path)
+        self.chunks = pd.read_csv(cov_path, chunksize=input_chunk_size)
+        self.buffer = {}
+        # Cases already requested, whose rows are not kept anymore
+        self.past_case_ids = set()
+        self.end_of_file = False
+
+    def read_next_chunk(self):
+        """
+        Reads the next chunk of the file into the buffer. The rows of the cases already requested are ignored
+
+        :return: Number of rows read
+        :rtype: int
+        """
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.end_of_file = True
+            self.chunks.close()
+            return 0
+        rows = chunk.to_numpy(dtype=object)
+        for case_id, row in zip(chunk.iloc[:, 0].astype(str), rows):
+            if case_id not in self.past_case_ids:
+                self.buffer[case_id] = row
+        return len(chunk)
+
+    def get_rows(self, case_ids):
+        """
+        Returns the co-variables of cases, in the same order. The rows of the cases without co-variables are empty
+        (filled with None)
+
+        :param case_ids: IDs of the cases
+        :type case_ids: list
+        :return: One row of co-variables per case
+        :rtype: np.ndarray
+        """
+        case_ids = [str(case_id) for case_id in case_ids]
+        rows = [None] * len(case_ids)
+        for i, case_id in enumerate(case_ids):
+            # Read the file until the case is found, or until the buffer is full of rows of the next cases. These rows
+            # are never removed before their case is requested
+            while case_id not in self.buffer and not self.end_of_file and len(self.buffer) < self.max_lookahead:
+                self.read_next_chunk()
+            rows[i] = self.buffer.pop(case_id, None)
+            self.past_case_ids.add(case_id)
+        result = np.empty((len(case_ids), len(self.column_names)), dtype=object)
+        for i, row in enumerate(rows):
+            if row is not None:
+                result[i] = row
+        return result
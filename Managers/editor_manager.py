@@ -38,6 +38,21 @@ class EditorManager:
             case = editor.edit_case(case, orchestrator)
         return case
 
+    def edit_batch(self, batch, orchestrator):
+        """
+        Edits all the cases of a batch according to its editors
+
+        :param batch: Cases to process
+        :type batch: CaseBatch
+        :param orchestrator: Orchestrator
+        :type orchestrator: Orchestrator
+        :return: Edited cases
+        :rtype: CaseBatch
+        """
+        for editor in self.editors:
+            batch = editor.edit_batch(batch, orchestrator)
+        return batch
+
     def get_editors_names(self):
         """
         Returns all the names of the editors of the manager
@@ -0,0 +1,191 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import csv
+import os
+
+import numpy as np
+
+from generic_functions import add_to_histogram
+
+
+class EncodedStore:
+
+    def __init__(self, output_name, file_type="data") -> None:
+        """
+        Storage of encoded cases. All the events of all the cases are stored one after the other inside a single typed
+        binary file (one row per event), and the first row of each case inside a second file (int64 offsets, followed
+        by the total number of rows). A small header gives the number of cases and rows, the type and the names of the
+        columns, and the number of cases of each length. Both binary files are memory mapped, so reading any case is
+        done without copy
+
+        :param output_name: Name of the output folder
+        :type output_name: str
+        :param file_type: Nature of the encoded file (data or cov)
+        :type file_type: str
+        """
+        self.folder = "Output/" + output_name + "/"
+        self.file_type = file_type
+        self.column_names = []
+        self.dtype = None
+        self.case_counter = 0
+        self.row_counter = 0
+        self.length_histogram = np.zeros(1, dtype=np.int64)
+        self.values = None
+        self.offsets = None
+        self.values_file = None
+        self.offsets_file = None
+
+    def get_path(self, suffix):
+        return self.folder + self.file_type + "_" + suffix
+
+    def exists(self):
+        """
+        Checks if the store was completely written
+
+        :return: True if the store can be read
+        :rtype: bool
+        """
+        return os.path.exists(self.get_path("header.csv"))
+
+    def open_for_writing(self, column_names, dtype):
+        """
+        Starts a new store, whose cases will be added with append
+
+        :param column_names: Names of the encoded columns
+        :type column_names: list
+        :param dtype: Type of the encoded values
+        :type dtype: np.dtype
+        """
+        if self.exists():
+            os.remove(self.get_path("header.csv"))
+        self.column_names = list(column_names)
+        self.dtype = np.dtype(dtype)
+        self.case_counter = 0
+        self.row_counter = 0
+        self.length_histogram = np.zeros(1, dtype=np.int64)
+        self.values_file = open(self.get_path("values.bin"), 'wb')
+        self.offsets_file = open(self.get_path("offsets.bin"), 'wb')
+        self.offsets_file.write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def append(self, cases):
+        """
+        Adds encoded cases at the end of the store
+
+        :param cases: Encoded cases, each one being an array with one row per event
+        :type cases: list
+        """
+        if len(cases) == 0:
+            return
+        lengths = np.asarray([len(case) for case in cases], dtype=np.int64)
+        values = np.concatenate(cases).astype(self.dtype, copy=False)
+        self.values_file.write(np.ascontiguousarray(values).tobytes())
+        self.offsets_file.write((np.cumsum(lengths) + self.row_counter).tobytes())
+        self.case_counter += len(cases)
+        self.row_counter += int(lengths.sum())
+        self.length_histogram = add_to_histogram(self.length_histogram, lengths)
+
+    def close(self):
+        """
+        Ends the writing of the store, and writes its header
+
+        """
+        self.values_file.close()
+        self.offsets_file.close()
+        self.values_file = None
+        self.offsets_file = None
+        with open(self.get_path("header.csv"), 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(["Number of cases", self.case_counter])
+            writer.writerow(["Number of rows", self.row_counter])
+            writer.writerow(["Type of the values", self.dtype.str])
+            writer.writerow(["Names of the columns"] + self.column_names)
+            writer.writerow(["Number of cases of each length"] + self.length_histogram.tolist())
+
+    def open_for_reading(self):
+        """
+        Reads the header of the store, and maps its binary files into memory
+
+        :return: The store itself
+        :rtype: EncodedStore
+        """
+        if not self.exists():
+            raise RuntimeError("The encoded cases of " + self.folder + " were not found: the data must be encoded "
+                               "first")
+        with open(self.get_path("header.csv"), 'r') as input_file:
+            reader = csv.reader(input_file)
+            self.case_counter = int(next(reader)[1])
+            self.row_counter = int(next(reader)[1])
+            self.dtype = np.dtype(next(reader)[1])
+            self.column_names = next(reader)[1:]
+            self.length_histogram = np.asarray(next(reader)[1:], dtype=np.int64)
+        self.offsets = np.memmap(self.get_path("offsets.bin"), dtype=np.int64, mode='r',
+                                 shape=(self.case_counter + 1,))
+        if self.row_counter == 0 or len(self.column_names) == 0:
+            self.values = np.empty((self.row_counter, len(self.column_names)), dtype=self.dtype)
+        else:
+            self.values = np.memmap(self.get_path("values.bin"), dtype=self.dtype, mode='r',
+                                    shape=(self.row_counter, len(self.column_names)))
+        return self
+
+    def get_case_counter(self):
+        """
+        Returns the number of stored cases
+
+        :return: Number of cases
+        :rtype: int
+        """
+        return self.case_counter
+
+    def get_prefix_counter(self):
+        """
+        Returns the number of prefixes of the stored cases (every event of a case, except the first one, ends a prefix)
+
+        :return: Number of prefixes
+        :rtype: int
+        """
+        return self.row_counter - self.case_counter
+
+    def get_lengths(self, start=0, stop=None):
+        """
+        Returns the number of events of the cases between two indexes
+
+        :param start: Index of the first case
+        :type start: int
+        :param stop: Index after the last case (by default, the last case)
+        :type stop: int
+        :return: Length of every case
+        :rtype: np.ndarray
+        """
+        stop = self.case_counter if stop is None else stop
+        return np.diff(self.offsets[start:stop + 1])
+
+    def get_case(self, index):
+        """
+        Returns an encoded case, without copy
+
+        :param index: Index of the case
+        :type index: int
+        :return: Events of the case
+        :rtype: np.ndarray
+        """
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def get_batch(self, start, stop):
+        """
+        Returns the events of the encoded cases between two indexes, without copy, with the offsets of the cases inside
+        these events
+
+        :param start: Index of the first case
+        :type start: int
+        :param stop: Index after the last case
+        :type stop: int
+        :return: Events of the cases, and the first row of each case followed by the total number of rows
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        offsets = np.asarray(self.offsets[start:stop + 1], dtype=np.int64)
+        return self.values[offsets[0]:offsets[-1]], offsets - offsets[0]
@@ -90,6 +90,55 @@ class EncoderManager:
         new_case = np.hstack(results)
         return new_case
 
+    def encode_batch(self, values, offsets):
+        """
+        Encodes all the cases of a batch. Each encoder is called once, and writes its columns inside a single matrix
+        allocated for the whole batch. The cases keep the offsets of the batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Encoded events of all the cases
+        :rtype: np.ndarray
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        encoders = [encoder for encoder in self.encoders if encoder.output_column_names is not None]
+        column_counter = sum(len(encoder.output_column_names) for encoder in encoders)
+        encoded_batch = np.empty((offsets[-1], column_counter), dtype=self.get_output_dtype())
+        column_index = 0
+        for encoder in encoders:
+            next_column_index = column_index + len(encoder.output_column_names)
+            if offsets[-1] > 0:
+                encoded_batch[:, column_index:next_column_index] = encoder.encode_batch(values, offsets)
+            column_index = next_column_index
+        return encoded_batch
+
+    def decode_batch(self, values, offsets):
+        """
+        Decodes all the cases of a batch (the encoders being decoders). Each decoder is called once, and the decoded
+        columns are put side by side
+
+        :param values: Values of each encoded column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: Decoded events of all the cases
+        :rtype: np.ndarray
+        """
+        return np.hstack([decoder.encode_batch(values, offsets) for decoder in self.encoders
+                          if decoder.output_column_names is not None])
+
+    def get_output_dtype(self):
+        """
+        Returns the type of the encoded cases: the common type of the values of all the encoders
+
+        :return: Type of the encoded values
+        :rtype: np.dtype
+        """
+        return np.result_type(*[encoder.output_dtype for encoder in self.encoders
+                                if encoder.output_column_names is not None])
+
     def get_leftover(self, case):
         """
         Gets the leftover built by all the encoders for a case
@@ -106,6 +155,27 @@ class EncoderManager:
             every_leftover = np.asarray([])
         return every_leftover
 
+    def get_leftover_batch(self, values, offsets):
+        """
+        Gets the leftovers built by all the encoders for all the cases of a batch
+
+        :param values: Values of each column of the batch
+        :type values: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        :return: One row of leftovers per case
+        :rtype: np.ndarray
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        encoders = [encoder for encoder in self.encoders if encoder.leftover_name is not None]
+        if not encoders:
+            return np.empty((len(offsets) - 1, 0))
+        leftovers = np.empty((len(offsets) - 1, len(encoders)), dtype=object)
+        if len(offsets) > 1:
+            for i, encoder in enumerate(encoders):
+                leftovers[:, i] = encoder.get_leftover_batch(values, offsets)
+        return leftovers
+
     def remove_duplicate_leftovers(self):
         """
         Removes the duplicate leftovers. Used if multiple encoders process the same columns
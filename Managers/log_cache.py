@@ -0,0 +1,304 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import csv
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from Managers.chunk_index import flag_last, read_column_names, read_chunks
+
+
+class LogCache:
+
+    def __init__(self, input_path, dates_ids=None, cache_folder="Cache") -> None:
+        """
+        Binary columnar copy of a parsed CSV file. Each column is stored as a raw binary file that can be memory mapped:
+        numbers and booleans keep their type, dates are stored as int64 timestamps (with the unit given by pandas) and
+        strings are dictionary encoded into int32 codes. The cache is tied to the size, modification time and hash of
+        the CSV file, and to the size of the chunks: pandas infers the types of the columns chunk by chunk, so the
+        cached chunks only match the chunks of the CSV file if they are cut the same way. The cache is not built if a
+        column changes its type from one chunk to another
+
+        :param input_path: Name of the cached CSV file
+        :type input_path: str
+        :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
+        :type dates_ids: list
+        :param cache_folder: Folder where all the caches are stored
+        :type cache_folder: str
+        """
+        self.input_path = input_path
+        self.dates_ids = [int(i) for i in dates_ids] if dates_ids else []
+        path_hash = hashlib.md5(os.path.abspath(input_path).encode()).hexdigest()[:8]
+        self.folder = cache_folder + "/" + os.path.basename(input_path) + "_" + path_hash + "/"
+        self.column_names = []
+        self.column_kinds = []
+        self.row_counter = 0
+        self.input_chunk_size = None
+        self.dictionaries = []
+        self.files = []
+        self.is_complete = False
+
+    @staticmethod
+    def get_file_hash(input_path, block_size=1 << 20):
+        """
+        Computes the hash of a file
+
+        :param input_path: Name of the file
+        :type input_path: str
+        :param block_size: Number of bytes read at once
+        :type block_size: int
+        :return: Hexadecimal hash of the file
+        :rtype: str
+        """
+        file_hash = hashlib.blake2b()
+        with open(input_path, 'rb') as input_file:
+            for block in iter(lambda: input_file.read(block_size), b''):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def get_column_kind(column):
+        """
+        Returns how a parsed column is stored inside the cache
+
+        :param column: Column to store
+        :type column: pd.Series
+        :return: Kind of the column: int, float, bool, text, or the type of the dates (such as datetime64[ns])
+        :rtype: str
+        """
+        if pd.api.types.is_bool_dtype(column.dtype):
+            return "bool"
+        if pd.api.types.is_integer_dtype(column.dtype):
+            return "int"
+        if pd.api.types.is_float_dtype(column.dtype):
+            return "float"
+        if pd.api.types.is_datetime64_dtype(column.dtype):
+            return str(column.dtype)
+        return "text"
+
+    def get_column_path(self, column_id):
+        return self.folder + str(column_id) + ".bin"
+
+    def is_valid(self, input_chunk_size=None):
+        """
+        Checks if the cache exists and matches the CSV file: same size, and either the same modification time or the
+        same hash (the hash is only computed if the modification time changed). The cache must also have been built
+        with the same chunk size, if one is given
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: True if the cache can be used
+        :rtype: bool
+        """
+        if not os.path.exists(self.folder + "header.csv") or not os.path.exists(self.input_path):
+            return False
+        with open(self.folder + "header.csv", 'r') as input_file:
+            reader = csv.reader(input_file)
+            file_size = int(next(reader)[1])
+            file_mtime = float(next(reader)[1])
+            file_hash = next(reader)[1]
+            dates_ids = [int(i) for i in next(reader)[1:]]
+            row_counter = int(next(reader)[1])
+            built_chunk_size = int(next(reader)[1])
+            _ = next(reader)
+            columns = list(reader)
+        if input_chunk_size is not None and input_chunk_size != built_chunk_size:
+            return False
+        file_stat = os.stat(self.input_path)
+        if file_stat.st_size != file_size or dates_ids != self.dates_ids:
+            return False
+        if file_stat.st_mtime != file_mtime and self.get_file_hash(self.input_path) != file_hash:
+            return False
+        self.row_counter = row_counter
+        self.input_chunk_size = built_chunk_size
+        self.column_names = [column[0] for column in columns]
+        self.column_kinds = [column[1] for column in columns]
+        self.dictionaries = []
+        for column_id, kind in enumerate(self.column_kinds):
+            if kind == "text":
+                values = np.load(self.folder + str(column_id) + "_values.npy").astype(object)
+                # Code -1 (empty value) points to the last element
+                self.dictionaries.append(np.append(values, np.nan))
+            else:
+                self.dictionaries.append(None)
+        self.is_complete = True
+        return True
+
+    def open_for_writing(self, column_names, input_chunk_size):
+        """
+        Starts a new cache, whose chunks will be added with append_chunk
+
+        :param column_names: Names of the columns of the file
+        :type column_names: list
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        """
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        if os.path.exists(self.folder + "header.csv"):
+            os.remove(self.folder + "header.csv")
+        self.column_names = list(column_names)
+        self.column_kinds = [None] * len(self.column_names)
+        self.dictionaries = [{} for _ in self.column_names]
+        self.files = [open(self.get_column_path(i), 'wb') for i in range(len(self.column_names))]
+        self.row_counter = 0
+        self.input_chunk_size = input_chunk_size
+        self.is_complete = False
+
+    def append_chunk(self, chunk):
+        """
+        Adds a parsed chunk to the cache. Must be called before removing the empty values of the chunk
+
+        :param chunk: Parsed chunk
+        :type chunk: pd.DataFrame
+        :return: False if the chunk cannot be stored, because a column changed its type (even from integers to floats,
+        for a chunk with empty values), or holds texts mixed with other values
+        :rtype: bool
+        """
+        for column_id, column_name in enumerate(self.column_names):
+            column = chunk[column_name]
+            kind = self.get_column_kind(column)
+            previous_kind = self.column_kinds[column_id]
+            if previous_kind is not None and previous_kind != kind:
+                print("The cache of", self.input_path, "is not built: column", column_name, "changes its type")
+                self.abort()
+                return False
+            if kind == "text" and pd.api.types.infer_dtype(column, skipna=True) != "string":
+                print("The cache of", self.input_path, "is not built: column", column_name, "mixes texts with other "
+                      "values")
+                self.abort()
+                return False
+            self.column_kinds[column_id] = kind
+            if kind == "text":
+                dictionary = self.dictionaries[column_id]
+                codes = np.full(len(column), -1, dtype=np.int32)
+                not_empty = column.notna().to_numpy()
+                uniques, inverse = np.unique(column[not_empty].to_numpy(dtype=str), return_inverse=True)
+                unique_codes = np.asarray([dictionary.setdefault(value, len(dictionary)) for value in uniques],
+                                          dtype=np.int32)
+                codes[not_empty] = unique_codes[inverse.reshape(-1)]
+                values = codes
+            elif kind.startswith("datetime64"):
+                values = column.to_numpy().view(np.int64)
+            elif kind == "float":
+                values = column.to_numpy(dtype=np.float64)
+            elif kind == "int":
+                values = column.to_numpy(dtype=np.int64)
+            else:
+                values = column.to_numpy(dtype=np.bool_)
+            self.files[column_id].write(np.ascontiguousarray(values).tobytes())
+        self.row_counter += len(chunk)
+        return True
+
+    def abort(self):
+        """
+        Stops writing the cache, which stays invalid
+
+        """
+        for output_file in self.files:
+            output_file.close()
+        self.files = []
+        self.is_complete = False
+
+    def close(self):
+        """
+        Ends the writing of the cache, and writes its header
+
+        """
+        for output_file in self.files:
+            output_file.close()
+        self.files = []
+        file_stat = os.stat(self.input_path)
+        dictionaries = []
+        for column_id, kind in enumerate(self.column_kinds):
+            if kind == "text":
+                values = np.asarray(list(self.dictionaries[column_id].keys()), dtype=str)
+                np.save(self.folder + str(column_id) + "_values.npy", values)
+                dictionaries.append(np.append(values.astype(object), np.nan))
+            else:
+                dictionaries.append(None)
+        self.dictionaries = dictionaries
+        with open(self.folder + "header.csv", 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(["Size of the input file", file_stat.st_size])
+            writer.writerow(["Modification time of the input file", repr(file_stat.st_mtime)])
+            writer.writerow(["Hash of the input file", self.get_file_hash(self.input_path)])
+            writer.writerow(["IDs of all the dates columns"] + self.dates_ids)
+            writer.writerow(["Number of rows", self.row_counter])
+            writer.writerow(["Size of the chunks", self.input_chunk_size])
+            writer.writerow(["Column name", "Kind"])
+            writer.writerows(zip(self.column_names, self.column_kinds))
+        self.is_complete = True
+
+    def build(self, input_chunk_size):
+        """
+        Converts the whole CSV file into the cache
+
+        :param input_chunk_size: Maximum number of lines parsed at once
+        :type input_chunk_size: int
+        :return: True if the cache was built
+        :rtype: bool
+        """
+        column_names = read_column_names(self.input_path)
+        self.open_for_writing(column_names, input_chunk_size)
+        for chunk, _ in read_chunks(self.input_path, input_chunk_size, column_names, self.dates_ids):
+            if not self.append_chunk(chunk):
+                return False
+        self.close()
+        return True
+
+    def get_column(self, column_id, start, stop, memory_map):
+        """
+        Reads the values of a column between two rows
+
+        :param column_id: Index of the column
+        :type column_id: int
+        :param start: First row
+        :type start: int
+        :param stop: Row after the last one
+        :type stop: int
+        :param memory_map: Memory map of the column
+        :type memory_map: np.memmap
+        :return: Values of the column, with the same type as if they were read from the CSV file
+        :rtype: np.ndarray
+        """
+        kind = self.column_kinds[column_id]
+        values = np.array(memory_map[start:stop])
+        if kind == "text":
+            return self.dictionaries[column_id][values]
+        if kind.startswith("datetime64"):
+            return values.view(kind)
+        return values
+
+    def read_chunks(self, input_chunk_size):
+        """
+        Reads the cached file by chunks. The chunks are the same as the ones read from the CSV file, if the cache was
+        built with the same chunk size
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: Generator of (chunk, is it the last chunk)
+        :rtype: Generator
+        """
+        dtypes = {"int": np.int64, "float": np.float64, "bool": np.bool_, "text": np.int32}
+        memory_maps = []
+        for column_id, kind in enumerate(self.column_kinds):
+            kind = "int" if kind.startswith("datetime64") else kind
+            if self.row_counter == 0:
+                memory_maps.append(np.empty(0, dtype=dtypes[kind]))
+            else:
+                memory_maps.append(np.memmap(self.get_column_path(column_id), dtype=dtypes[kind], mode='r',
+                                             shape=(self.row_counter,)))
+        starts = range(0, self.row_counter, input_chunk_size)
+        for start, last_chunk in flag_last(starts):
+            stop = min(start + input_chunk_size, self.row_counter)
+            chunk = pd.DataFrame({column_name: self.get_column(column_id, start, stop, memory_maps[column_id])
+                                  for column_id, column_name in enumerate(self.column_names)})
+            yield chunk, last_chunk
@@ -6,18 +6,120 @@ Licence: AGPL v3
 """
 
 import csv
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from generic_functions import remove_nan, get_cases_info, get_complete_cases, create_directories, get_names, \
-    merge_data_cov
+from case_batch import CaseBatch
+from generic_functions import remove_nan, get_chunk_cases, merge_cases_info, get_complete_batch, create_directories, \
+    get_names, merge_data_cov, map_in_order, split_range_cases
+from Managers.chunk_index import ChunkIndex, flag_last, read_column_names, read_raw_chunks, parse_raw_chunk, \
+    read_chunks, read_indexed_chunks, read_indexed_raw_chunks
+from Managers.covariate_reader import CovariateReader
+from Managers.encoded_store import EncodedStore
+from Managers.log_cache import LogCache
 from Managers.editor_manager import EditorManager
 from Managers.encoder_manager import EncoderManager
 from Encoders import *
 
 
+# Information shared by all the chunks analyzed by a worker process
+analysis_context = None
+
+
+def init_analysis_worker(column_names, dates_ids, encoders, keep_chunks):
+    """
+    Initializes a worker process analyzing chunks
+
+    :param column_names: Names of the columns of the file
+    :type column_names: list
+    :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
+    :type dates_ids: list
+    :param encoders: Encoders to update (only their partial states are computed)
+    :type encoders: list
+    :param keep_chunks: Defines if the parsed chunks are sent back (to be written inside the cache)
+    :type keep_chunks: bool
+    """
+    global analysis_context
+    analysis_context = (column_names, dates_ids, encoders, keep_chunks)
+
+
+def analyze_raw_chunk(offset, raw_chunk, last_chunk):
+    """
+    Parses a raw chunk and computes everything needed to analyze the file: summary of its cases and partial state of
+    every encoder. Run by a worker process
+
+    :param offset: Byte offset of the chunk inside the file
+    :type offset: int
+    :param raw_chunk: Raw content of the chunk
+    :type raw_chunk: bytes
+    :param last_chunk: Defines if it is the last chunk of the file
+    :type last_chunk: bool
+    :return: Size of the chunk in bytes, offset, is it the last chunk, parsed chunk (if kept), and analysis
+    :rtype: (int, int, bool, pd.DataFrame, (tuple, list))
+    """
+    column_names, dates_ids, encoders, keep_chunks = analysis_context
+    og_chunk = parse_raw_chunk(raw_chunk, column_names, dates_ids)
+    chunk = remove_nan(og_chunk.copy() if keep_chunks else og_chunk)
+    partial_states = [encoder.get_partial_state(chunk) for encoder in encoders]
+    chunk_cases = get_chunk_cases(chunk[column_names[0]].to_numpy())
+    return len(raw_chunk), offset, last_chunk, og_chunk if keep_chunks else None, \
+        (chunk_cases, partial_states)
+
+
+# Orchestrator used by a worker process to edit and encode batches
+processing_orchestrator = None
+
+
+def init_processing_worker(orchestrator):
+    """
+    Initializes a worker process editing and encoding batches
+
+    :param orchestrator: Orchestrator, with its fitted encoders and editors
+    :type orchestrator: Orchestrator
+    """
+    global processing_orchestrator
+    processing_orchestrator = orchestrator
+
+
+def process_batch_in_worker(batch, edit_db):
+    """
+    Edits and encodes all the cases of a batch. Run by a worker process
+
+    :param batch: Cases to process
+    :type batch: CaseBatch
+    :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
+    :type edit_db: bool
+    :return: Encoded cases and their leftovers
+    :rtype: (list, np.ndarray)
+    """
+    return processing_orchestrator.process_batch(batch, edit_db)
+
+
+def process_raw_chunk_in_worker(raw_chunk, last_chunk, edit_db):
+    """
+    Parses a raw chunk, then edits and encodes its complete cases. Run by a worker process. The first and last cases of
+    the chunk may be incomplete: they are sent back, to be joined with the cases of the previous and next chunks
+
+    :param raw_chunk: Raw content of the chunk
+    :type raw_chunk: bytes
+    :param last_chunk: Defines if it is the last chunk of the file
+    :type last_chunk: bool
+    :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
+    :type edit_db: bool
+    :return: Events of the first case, encoded complete cases and their leftovers, events of the last case, is it the
+    last chunk
+    :rtype: (pd.DataFrame, (list, np.ndarray), pd.DataFrame, bool)
+    """
+    orchestrator = processing_orchestrator
+    chunk = remove_nan(parse_raw_chunk(raw_chunk, orchestrator.column_names, orchestrator.dates_ids))
+    head, batch, tail = split_range_cases(chunk, orchestrator.column_names[0])
+    return head, orchestrator.process_batch(batch, edit_db), tail, last_chunk
+
+
 class Orchestrator:
     def __init__(self, encoder_manager, editor_manager=None) -> None:
         """
@@ -39,13 +141,16 @@ class Orchestrator:
         self.double_timestamps = None
         self.activity_counter = None
         self.max_case_length = None
+        self.length_histogram = None
+        self.chunk_index = None
+        self.log_cache = None
         self.features_counter = len(encoder_manager.all_output_column_names)
         self.has_leftovers = len(encoder_manager.get_leftover_names()) > 0
         self.encoder_counter = encoder_manager.get_encoder_counter()
         self.encoder_descriptions = encoder_manager.get_all_encoders_description()
 
     def insert_infos(self, input_path, output_name, column_names, dates_ids, case_counter, total_chunk_counter,
-                     double_timestamps, activity_counter, max_case_length) -> None:
+                     double_timestamps, activity_counter, max_case_length, length_histogram=None) -> None:
         """
         Description of the input data file
 
@@ -67,6 +172,8 @@ class Orchestrator:
         :type activity_counter: int
         :param max_case_length: Maximum length of a case
         :type max_case_length: int
+        :param length_histogram: Number of cases of each length (the index being the number of events)
+        :type length_histogram: np.ndarray
         """
         super().__init__()
         self.input_path = input_path
@@ -78,6 +185,7 @@ class Orchestrator:
         self.double_timestamps = double_timestamps
         self.activity_counter = activity_counter
         self.max_case_length = max_case_length
+        self.length_histogram = length_histogram
         self.features_counter = len(self.encoder_manager.all_output_column_names)
         self.has_leftovers = len(self.encoder_manager.get_leftover_names()) > 0
         self.encoder_counter = self.encoder_manager.get_encoder_counter()
@@ -100,6 +208,19 @@ class Orchestrator:
         print("Number of encoders:", self.encoder_counter)
         print("---------------------------")
 
+    def get_prefix_counter(self):
+        """
+        Returns the number of prefixes of all the cases (every event of a case, except the first one, ends a prefix),
+        computed from the histogram of the lengths of the cases
+
+        :return: Number of prefixes
+        :rtype: int
+        """
+        if self.length_histogram is None:
+            raise RuntimeError("The lengths of the cases are unknown: the data must be analyzed again")
+        lengths = np.arange(len(self.length_histogram))
+        return int(np.sum(self.length_histogram[1:] * (lengths[1:] - 1)))
+
     def alter_internal_infos(self):
         """
         Allows the encoders to tamper with the internal orchestrator infos
@@ -117,6 +238,29 @@ class Orchestrator:
             for encoder in self.encoder_manager.encoders:
                 encoder.tamper(self.editor_manager.activities_to_add)
 
+    def process_batch(self, batch, edit_db=False):
+        """
+        Edits and encodes all the cases of a batch
+
+        :param batch: Cases to process
+        :type batch: CaseBatch
+        :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
+        :type edit_db: bool
+        :return: Encoded cases and their leftovers
+        :rtype: (list, np.ndarray)
+        """
+        if self.editor_manager:
+            batch = self.editor_manager.edit_batch(batch, self)
+        if edit_db:
+            return batch.get_cases(), np.asarray([])
+        encoded_batch = self.encoder_manager.encode_batch(batch.columns, batch.offsets)
+        leftovers = self.encoder_manager.get_leftover_batch(batch.columns, batch.offsets)
+        if batch.get_case_counter() == 0:
+            return [], leftovers
+        # Each case is a view inside the encoded batch
+        encoded_cases = np.split(encoded_batch, batch.offsets[1:-1])
+        return encoded_cases, leftovers
+
     def process_cases(self, cases, edit_db=False):
         """
         Edits and encodes the input cases
@@ -128,38 +272,21 @@ class Orchestrator:
         :return: Encoded cases and their leftovers
         :rtype: (np.ndarray, np.ndarray)
         """
-        encoded_cases = []
-        leftovers = []
-        for case in cases:
-            np_case = case.to_numpy()
-            if self.editor_manager:
-                np_case = self.editor_manager.edit_case(np_case, self)
-            if edit_db:
-                encoded_cases.append(np_case)
-            else:
-                encoded_case = self.encoder_manager.encode_case(np_case)
-                leftover = self.encoder_manager.get_leftover(np_case)
-                encoded_cases.append(encoded_case)
-                leftovers.append(leftover)
-        leftovers = np.asarray(leftovers)
-        return encoded_cases, leftovers
+        if len(cases) == 0:
+            return [], np.asarray([])
+        return self.process_batch(CaseBatch.from_cases([np.asarray(case) for case in cases]), edit_db)
 
     def process_case(self, case):
         """
         Edits and encodes the input case
 
         :param case: Case to process
-        :type case: pd.Dataframe
+        :type case: np.ndarray
         :return: Encoded cases and their leftovers
         :rtype: (np.ndarray, np.ndarray)
         """
-        np_case = case.to_numpy()
-        if self.editor_manager:
-            np_case = self.editor_manager.edit_case(np_case, self)
-        encoded_case = self.encoder_manager.encode_case(np_case)
-        leftover = self.encoder_manager.get_leftover(np_case)
-        leftover = np.asarray(leftover)
-        return encoded_case, leftover
+        encoded_cases, leftovers = self.process_cases([case])
+        return encoded_cases[0], leftovers[0]
 
     def save_to_file(self):
         """
@@ -186,11 +313,86 @@ class Orchestrator:
         writer.writerow(["Encoders", self.encoder_counter])
         for info in self.encoder_descriptions:
             writer.writerows(info)
+        if self.length_histogram is not None:
+            writer.writerow(["Number of cases of each length"] + self.length_histogram.tolist())
+        if self.chunk_index is not None:
+            self.chunk_index.save_to_file(self.output_name)
+
+    def get_chunk_counter(self, input_chunk_size):
+        """
+        Returns the number of chunks to read the input file, if it is known without reading the file
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: Number of chunks, or None if the chunk index does not match
+        :rtype: int
+        """
+        if self.log_cache is not None and self.log_cache.is_complete and \
+                self.log_cache.input_chunk_size == input_chunk_size:
+            return ceil(self.log_cache.row_counter / input_chunk_size)
+        if self.chunk_index is not None and self.chunk_index.is_valid(self.input_path, input_chunk_size):
+            return self.chunk_index.get_chunk_counter()
+        return None
+
+    def read_chunks(self, input_chunk_size):
+        """
+        Reads the input file by chunks, without empty values. If the file has a cache, the chunks are read from the
+        cache. Else, if the chunk index matches the file and the size of a chunk, each chunk is read directly from its
+        byte offset
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: Generator of (chunk, is it the last chunk)
+        :rtype: Generator
+        """
+        if self.log_cache is not None and self.log_cache.is_valid(input_chunk_size):
+            chunks = self.log_cache.read_chunks(input_chunk_size)
+        elif self.get_chunk_counter(input_chunk_size) is not None:
+            chunks = read_indexed_chunks(self.chunk_index, self.column_names, self.dates_ids)
+        else:
+            chunks = read_chunks(self.input_path, input_chunk_size, self.column_names, self.dates_ids)
+        for chunk, last_chunk in chunks:
+            yield remove_nan(chunk), last_chunk
+
+    def read_raw_chunks(self, input_chunk_size):
+        """
+        Reads the input file by raw chunks, not parsed. If the chunk index matches the file and the size of a chunk,
+        each chunk is read directly from its byte offset
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: Generator of (raw chunk, is it the last chunk)
+        :rtype: Generator
+        """
+        if self.get_chunk_counter(input_chunk_size) is not None and self.log_cache is None:
+            raw_chunks = read_indexed_raw_chunks(self.chunk_index)
+        else:
+            raw_chunks = read_raw_chunks(self.input_path, input_chunk_size)
+        for (_, raw_chunk), last_chunk in flag_last(raw_chunks):
+            yield raw_chunk, last_chunk
+
+    def read_batches(self, input_chunk_size):
+        """
+        Reads the input file by batches of complete cases. The last case of a chunk is kept until the next chunk is read
+
+        :param input_chunk_size: Maximum number of lines stored inside a chunk
+        :type input_chunk_size: int
+        :return: Generator of batches
+        :rtype: Generator
+        """
+        id_column = self.column_names[0]
+        previous_case = None
+        for chunk, last_chunk in self.read_chunks(input_chunk_size):
+            batch, previous_case = get_complete_batch(chunk, id_column, last_chunk, previous_case)
+            yield batch
 
-    def init_from_data(self, input_path, output_name, input_chunk_size, double_timestamps, dates_ids=None):
+    def init_from_data(self, input_path, output_name, input_chunk_size, double_timestamps, dates_ids=None,
+                       use_cache=False, workers=1):
         """
         Reads the input file to generate the internal representations of all the encoders. The file is loaded by
-        chunks, to avoid an overflow in the RAM
+        chunks, to avoid an overflow in the RAM. The file is read only once, and the byte offsets, sizes and case
+        boundaries of the chunks are stored inside a chunk index, used afterwards to read the chunks. If the cache is
+        used, it is built during this reading (or read directly, if it already exists)
 
         :param input_path: Name of the file to read
         :type input_path: str
@@ -202,51 +404,96 @@ class Orchestrator:
         :type double_timestamps: bool
         :param dates_ids: Indexes of the dates columns (for pandas to parse those dates as Timestamps, not strings)
         :type dates_ids: list
+        :param use_cache: Defines if the parsed file is stored inside a binary columnar cache, read afterwards instead
+        of the file
+        :type use_cache: bool
+        :param workers: Number of processes parsing and analyzing the chunks at the same time. The encoders are then
+        updated with the partial states of the chunks
+        :type workers: int
         :return: Total number of chunks, number of activities, number of cases, maximum length of a case, names of all
         columns of the data file
         :rtype: (int, int, int, int, np.ndarray)
         """
-        chunks = pd.read_csv(input_path, chunksize=input_chunk_size)
-        total_chunk_counter = 0
-        for _ in chunks:
-            total_chunk_counter += 1
-        if dates_ids:
-            chunks = pd.read_csv(input_path, chunksize=input_chunk_size, parse_dates=dates_ids)
+        column_names = read_column_names(input_path)
+        for encoder in self.encoder_manager.encoders:
+            encoder.set_column_names(column_names)
+        log_cache = LogCache(input_path, dates_ids) if use_cache else None
+        executor = None
+        if log_cache is not None and log_cache.is_valid(input_chunk_size):
+            # The file was already converted: the cache is read instead, and no chunk index is needed
+            chunk_index = None
+            pbar = tqdm(total=log_cache.row_counter, unit=' rows', desc="Analyze data")
+            chunks = ((len(chunk), None, last_chunk, chunk, None)
+                      for chunk, last_chunk in log_cache.read_chunks(input_chunk_size))
         else:
-            chunks = pd.read_csv(input_path, chunksize=input_chunk_size)
+            # Only the newlines are searched to cut the file into chunks, so the file is parsed once
+            chunk_index = ChunkIndex(input_path, input_chunk_size)
+            if log_cache is not None:
+                log_cache.open_for_writing(column_names, input_chunk_size)
+            pbar = tqdm(total=chunk_index.file_size, unit='B', unit_scale=True, desc="Analyze data")
+            raw_chunks = flag_last(read_raw_chunks(input_path, input_chunk_size))
+            raw_chunks = ((offset, raw_chunk, last_chunk) for (offset, raw_chunk), last_chunk in raw_chunks)
+            if workers > 1 and not all(encoder.is_mergeable() for encoder in self.encoder_manager.encoders):
+                print("The chunks are analyzed by a single process: some encoders cannot be updated with partial "
+                      "states")
+                workers = 1
+            if workers > 1:
+                executor = ProcessPoolExecutor(workers, initializer=init_analysis_worker,
+                                               initargs=(column_names, dates_ids, self.encoder_manager.encoders,
+                                                         log_cache is not None))
+                chunks = map_in_order(executor, analyze_raw_chunk, raw_chunks, 2 * workers)
+            else:
+                chunks = ((len(raw_chunk), offset, last_chunk, parse_raw_chunk(raw_chunk, column_names, dates_ids),
+                           None) for offset, raw_chunk, last_chunk in raw_chunks)
         activity_column = 1
         first_chunk = True
-        chunk_counter = 0
-        column_names = np.asarray([])
+        total_chunk_counter = 0
         case_counter = 0
         max_case_length = 0
+        length_histogram = np.zeros(1, dtype=np.int64)
         previous_id = None
         previous_size = None
-        for og_chunk in tqdm(chunks, total=total_chunk_counter, desc="Analyze data"):
-        # for og_chunk in chunks:
-            chunk = remove_nan(og_chunk)
-            last_chunk = chunk_counter == total_chunk_counter - 1
-            if first_chunk:
-                # Get the names of the columns of the CSV (used to reference the correct columns after)
-                column_names = chunk.columns
+        for progress, offset, last_chunk, og_chunk, analysis in chunks:
+            if chunk_index is not None and log_cache is not None and not log_cache.append_chunk(og_chunk):
+                log_cache = None
+            if analysis is None:
+                chunk = remove_nan(og_chunk)
+                chunk_cases = get_chunk_cases(chunk[column_names[0]].to_numpy())
                 for encoder in self.encoder_manager.encoders:
-                    encoder.set_column_names(column_names)
-            previous_id, previous_size, case_counter, max_case_length = \
-                get_cases_info(chunk, column_names[0], first_chunk, last_chunk, previous_id, previous_size,
-                               case_counter, max_case_length)
-            for encoder in self.encoder_manager.encoders:
-                encoder.update_encoder(chunk)
-            chunk_counter += 1
+                    encoder.update_encoder(chunk)
+            else:
+                # The chunk was analyzed by a worker
+                chunk_cases, partial_states = analysis
+                for encoder, partial_state in zip(self.encoder_manager.encoders, partial_states):
+                    encoder.merge(partial_state)
+            previous_id, previous_size, case_counter, max_case_length, length_histogram = \
+                merge_cases_info(chunk_cases, first_chunk, last_chunk, previous_id, previous_size, case_counter,
+                                 max_case_length, length_histogram)
+            if chunk_index is not None:
+                chunk_index.add_chunk(offset, progress)
+            pbar.update(progress)
+            total_chunk_counter += 1
             if first_chunk:
                 first_chunk = False
+        pbar.close()
+        if executor is not None:
+            executor.shutdown()
+        if chunk_index is not None and log_cache is not None:
+            log_cache.close()
+        self.log_cache = log_cache
+        self.chunk_index = chunk_index
         for encoder in self.encoder_manager.encoders:
             if encoder.column_id == activity_column:
                 activity_encoder = encoder
             encoder.finalize()
         self.encoder_manager.set_all_output_column_names()
-        activity_counter = len(activity_encoder.output_column_names)
+        if isinstance(activity_encoder, OneHotIndexEncoder):
+            # Activities are stored as indexes, in a single column
+            activity_counter = len(activity_encoder.unique_values)
+        else:
+            activity_counter = len(activity_encoder.output_column_names)
         self.insert_infos(input_path, output_name, column_names, dates_ids, case_counter, total_chunk_counter,
-                          double_timestamps, activity_counter, max_case_length)
+                          double_timestamps, activity_counter, max_case_length, length_histogram)
 
     def edit_online(self, input_chunk_size, output_chunk_size):
         """
@@ -264,33 +511,18 @@ class Orchestrator:
         :param output_chunk_size: Number of cases by chunk, used if the database is too big
         :type output_chunk_size: int
         """
-        # Get the list of chunks
-        chunks = pd.read_csv(self.input_path, chunksize=input_chunk_size, parse_dates=self.dates_ids)
-        # Create all preliminary data before the chunks are processed
-        id_column = self.column_names[0]
-        previous_case = None
-        previous_case_id = ""
-        first_chunk = True
-        chunk_counter = 0
         all_cases = []
         case_counter = 0
         # Process the chunk and record them
-        for og_chunk in chunks:
-            chunk_counter += 1
-            chunk = remove_nan(og_chunk)
-            last_chunk = chunk_counter == self.total_chunk_counter
-            complete_cases, case_ids, previous_case, previous_case_id = \
-                get_complete_cases(chunk, id_column, first_chunk, last_chunk, previous_case, previous_case_id)
-            case_counter += len(complete_cases)
-            if len(complete_cases) > 0:
-                modified_cases, leftovers = self.process_cases(complete_cases, edit_db=False)
+        for batch in self.read_batches(input_chunk_size):
+            case_counter += batch.get_case_counter()
+            if batch.get_case_counter() > 0:
+                modified_cases, leftovers = self.process_batch(batch, edit_db=False)
                 for i in range(len(modified_cases)):
                     all_cases.append(modified_cases[i])
                     if len(all_cases) == output_chunk_size:
                         yield all_cases
                         all_cases = []
-            if first_chunk:
-                first_chunk = False
         yield all_cases
 
     def process_online(self, input_chunk_size):
@@ -307,30 +539,66 @@ class Orchestrator:
         :param input_chunk_size: Number of lines by chunk, used if the database is too big
         :type input_chunk_size: int
         """
-        # Get the list of chunks
-        chunks = pd.read_csv(self.input_path, chunksize=input_chunk_size, parse_dates=self.dates_ids)
-        # Create all preliminary data before the chunks are processed
-        id_column = self.column_names[0]
-        previous_case = None
-        previous_case_id = ""
-        first_chunk = True
-        chunk_counter = 0
         case_counter = 0
         # Process the chunk and record them
-        for og_chunk in chunks:
-            chunk_counter += 1
-            chunk = remove_nan(og_chunk)
-            last_chunk = chunk_counter == self.total_chunk_counter
-            complete_cases, case_ids, previous_case, previous_case_id = \
-                get_complete_cases(chunk, id_column, first_chunk, last_chunk, previous_case, previous_case_id)
-            case_counter += len(complete_cases)
-            for case in complete_cases:
-                modified_case, leftover = self.process_case(case)
-                yield modified_case, leftover
-            if first_chunk:
-                first_chunk = False
+        for batch in self.read_batches(input_chunk_size):
+            case_counter += batch.get_case_counter()
+            if batch.get_case_counter() > 0:
+                modified_cases, leftovers = self.process_batch(batch)
+                for modified_case, leftover in zip(modified_cases, leftovers):
+                    yield modified_case, leftover
+
+    @staticmethod
+    def join_results(results):
+        """
+        Joins the results of several processed batches
 
-    def process_offline(self, input_chunk_size, edit_db=False, cov_path=None, debug=False):
+        :param results: List of (encoded cases, leftovers)
+        :type results: list
+        :return: Encoded cases and their leftovers
+        :rtype: (list, np.ndarray)
+        """
+        if not results:
+            return [], np.asarray([])
+        encoded_cases = [case for encoded_data, _ in results for case in encoded_data]
+        leftovers = np.concatenate([leftovers for _, leftovers in results])
+        return encoded_cases, leftovers
+
+    def stitch_range_results(self, results, edit_db=False):
+        """
+        Joins the results of chunks processed separately (see process_raw_chunk_in_worker): the incomplete first and
+        last cases of the chunks are joined, and processed when they are complete. The cases stay in their original
+        order
+
+        :param results: Results of the chunks, in the order of the file
+        :type results: Iterable
+        :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
+        :type edit_db: bool
+        :return: Generator of (encoded cases, leftovers), one for each chunk
+        :rtype: Generator
+        """
+        id_column = self.column_names[0]
+        previous_case = None
+        for head, processed_batch, tail, last_chunk in results:
+            chunk_results = []
+            if len(head) > 0:
+                if previous_case is not None and previous_case[id_column].iloc[-1] == head[id_column].iloc[0]:
+                    previous_case = pd.concat([previous_case, head], ignore_index=True)
+                else:
+                    if previous_case is not None:
+                        chunk_results.append(self.process_batch(CaseBatch.from_dataframe(previous_case, [0]), edit_db))
+                    previous_case = head
+            if tail is not None:
+                # The first case of the chunk is complete, as another case starts after it
+                chunk_results.append(self.process_batch(CaseBatch.from_dataframe(previous_case, [0]), edit_db))
+                chunk_results.append(processed_batch)
+                previous_case = tail
+            if last_chunk and previous_case is not None:
+                chunk_results.append(self.process_batch(CaseBatch.from_dataframe(previous_case, [0]), edit_db))
+                previous_case = None
+            yield self.join_results(chunk_results)
+
+    def process_offline(self, input_chunk_size, edit_db=False, cov_path=None, debug=False, workers=1):
         """
         Converts the raw data into interpretable data for the neural network.
 
@@ -345,36 +613,52 @@ class Orchestrator:
         :type input_chunk_size: int
         :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
         :type edit_db: bool
+        :param workers: Number of processes editing and encoding the batches at the same time. The results are still
+        written in the order of the cases
+        :type workers: int
         """
         create_directories(self.output_name)
-        # Get the list of chunks
-        chunks = pd.read_csv(self.input_path, chunksize=input_chunk_size, parse_dates=self.dates_ids)
         # Create all preliminary data before the chunks are processed
-        id_column = self.column_names[0]
-        previous_case = None
-        previous_case_id = ""
         first_chunk = True
-        chunk_counter = 0
         case_counter = 0
+        # The co-variables are read alongside the cases
+        cov_reader = CovariateReader(cov_path, input_chunk_size) if cov_path else None
+        encoded_store = None
+        if not edit_db:
+            encoded_store = EncodedStore(self.output_name, get_names(False))
+            encoded_store.open_for_writing(self.encoder_manager.all_output_column_names,
+                                           self.encoder_manager.get_output_dtype())
+        executor = None
+        if workers > 1:
+            # Every worker holds a copy of the orchestrator, with its fitted encoders and editors
+            executor = ProcessPoolExecutor(workers, initializer=init_processing_worker, initargs=(self,))
+            if self.log_cache is not None and self.log_cache.is_valid(input_chunk_size):
+                results = map_in_order(executor, process_batch_in_worker,
+                                       ((batch, edit_db) for batch in self.read_batches(input_chunk_size)), 2 * workers)
+            else:
+                # The workers also parse the chunks
+                raw_chunks = ((raw_chunk, last_chunk, edit_db)
+                              for raw_chunk, last_chunk in self.read_raw_chunks(input_chunk_size))
+                results = self.stitch_range_results(
+                    map_in_order(executor, process_raw_chunk_in_worker, raw_chunks, 2 * workers), edit_db)
+        else:
+            results = (self.process_batch(batch, edit_db) for batch in self.read_batches(input_chunk_size))
         # Process the chunk and record them
-        for og_chunk in tqdm(chunks, total=self.total_chunk_counter, desc='Encode data'):
-        #for og_chunk in chunks:
-            chunk = remove_nan(og_chunk)
-            chunk_counter += 1
-            last_chunk = chunk_counter == self.total_chunk_counter
-            complete_cases, case_ids, previous_case, previous_case_id = \
-                get_complete_cases(chunk, id_column, first_chunk, last_chunk, previous_case, previous_case_id)
-            encoded_data, leftovers = self.process_cases(complete_cases, edit_db)
-            counter = len(complete_cases)
-            if cov_path:
-                cov_chunk = pd.read_csv(cov_path, skiprows=case_counter, nrows=len(complete_cases)).to_numpy()
-                encoded_data, counter = merge_data_cov(encoded_data, cov_chunk)
-            case_counter += counter
-            self.save_chunk_to_file(encoded_data, leftovers, first_chunk, edit_db, debug)
+        for encoded_data, leftovers in tqdm(results, total=self.get_chunk_counter(input_chunk_size),
+                                            desc='Encode data'):
+            if cov_reader is not None:
+                cov_chunk = cov_reader.get_rows([case[0][0] for case in encoded_data])
+                encoded_data = merge_data_cov(encoded_data, cov_chunk)
+            case_counter += len(encoded_data)
+            self.save_chunk_to_file(encoded_data, leftovers, first_chunk, edit_db, debug, encoded_store)
             if first_chunk:
                 first_chunk = False
+        if executor is not None:
+            executor.shutdown()
+        if encoded_store is not None:
+            encoded_store.close()
 
-    def save_chunk_to_file(self, encoded_chunk, leftovers, first_chunk, edit_db, debug=False):
+    def save_chunk_to_file(self, encoded_chunk, leftovers, first_chunk, edit_db, debug=False, encoded_store=None):
         """
         Saves the encoded chunk to a file
 
@@ -387,14 +671,13 @@ class Orchestrator:
         :type first_chunk: bool
         :param edit_db: Defines if a new csv with the edited data must be built. Else, a numpy file will be built
         :type edit_db: bool
+        :param encoded_store: Store of the encoded cases, opened for writing (only used if edit_db is False)
+        :type encoded_store: EncodedStore
         """
         file_type = get_names(False)
-        file_mode_numpy = 'wb' if first_chunk else 'ab'
         file_mode = 'w' if first_chunk else 'a'
         if not edit_db:
-            with open("Output/" + self.output_name + "/" + file_type + ".npy", file_mode_numpy) as output_file:
-                for element in encoded_chunk:
-                    np.save(output_file, element)
+            encoded_store.append(encoded_chunk)
             with open("Output/" + self.output_name + "/leftovers_" + file_type + ".csv", file_mode,
                       newline='') as output_file:
                 if first_chunk:
@@ -0,0 +1,9 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+from .streaming_predictor import *
+from .server import *
@@ -0,0 +1,312 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from case_batch import CaseBatch
+from DataPreparators.batch_builder import BatchBuilder
+from Predictors.streaming_predictor import StreamingPredictor
+
+
+class PredictionRequest:
+
+    def __init__(self, events, case_id=None) -> None:
+        """
+        Prediction waiting to be computed by the server, with the next activity as result
+
+        :param events: Raw events of a prefix, or the new event of a running case
+        :type events: list
+        :param case_id: ID of the running case of the event, or None for a prefix
+        :type case_id: Any
+        """
+        self.events = events
+        self.case_id = case_id
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def set_result(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    # Paths of the predictions: whole prefixes, or new events of running cases
+    prediction_paths = ("/predict", "/advance")
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.send_json(200, self.server.prediction_server.get_metrics())
+        else:
+            self.send_json(404, {"error": "Unknown path " + self.path})
+
+    def do_POST(self):
+        if self.path not in self.prediction_paths:
+            self.send_json(404, {"error": "Unknown path " + self.path})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if self.path == "/predict":
+                events, case_id = body["events"], None
+            else:
+                events, case_id = [body["event"]], body["case_id"]
+            if len(events) == 0:
+                raise ValueError("A prefix needs at least one event")
+        except (ValueError, KeyError, TypeError) as error:
+            self.send_json(400, {"error": "Invalid request: " + str(error)})
+            return
+        request = self.server.prediction_server.predict(events, case_id)
+        if request.error is not None:
+            self.send_json(500, {"error": request.error})
+        else:
+            self.send_json(200, request.result)
+
+    def send_json(self, status, content):
+        """
+        Sends a JSON response
+
+        :param status: HTTP status code
+        :type status: int
+        :param content: Content of the response
+        :type content: dict
+        """
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Requests are counted by the metrics instead of being printed one by one
+        pass
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    # Connections waiting to be accepted (the default of 5 resets the connections of concurrent clients)
+    request_queue_size = 128
+
+
+class PredictionServer:
+
+    def __init__(self, trainer, max_batch_size=64, max_wait=0.005, max_cases=10000, idle_time=None) -> None:
+        """
+        Local HTTP server predicting the next activity. The concurrent requests are queued, and a single thread
+        predicts them by micro-batches: a batch starts with the oldest request, and takes the following ones until it
+        has max_batch_size requests or max_wait seconds have passed. The paths are:
+
+        - POST /predict, with {"events": [event, ...]}: next activity of a prefix, given as raw events
+        - POST /advance, with {"case_id": ID, "event": event}: next activity of a running case after its new event (see
+          StreamingPredictor)
+        - GET /metrics: depth of the queue and sizes of the batches
+
+        An event is the list of the values of all the columns of the input file. The response is {"activity": name,
+        "probability": probability}
+
+        :param trainer: Trainer whose model was trained or loaded, and whose preparator was built with the orchestrator
+        of the data
+        :type trainer: LSTMTrainer
+        :param max_batch_size: Maximum number of requests predicted together
+        :type max_batch_size: int
+        :param max_wait: Maximum time (in seconds) waited for the following requests of a batch
+        :type max_wait: float
+        :param max_cases: Maximum number of running cases kept
+        :type max_cases: int
+        :param idle_time: Number of seconds after which a running case that received no event is forgotten
+        :type idle_time: float
+        """
+        self.trainer = trainer
+        self.orchestrator = trainer.preparator.orchestrator
+        self.decoder = trainer.preparator.output_decoders.encoders[0]
+        self.streaming_predictor = StreamingPredictor(trainer, max_cases, idle_time)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.http_server = None
+        # Set once the server accepts requests
+        self.ready = threading.Event()
+        self.metrics_lock = threading.Lock()
+        self.request_counter = 0
+        self.batch_counter = 0
+        self.batch_size_histogram = np.zeros(max_batch_size + 1, dtype=np.int64)
+
+    def predict(self, events, case_id=None):
+        """
+        Queues a request and waits for its prediction
+
+        :param events: Raw events of a prefix, or the new event of a running case
+        :type events: list
+        :param case_id: ID of the running case of the event, or None for a prefix
+        :type case_id: Any
+        :return: Computed request
+        :rtype: PredictionRequest
+        """
+        request = PredictionRequest(events, case_id)
+        self.requests.put(request)
+        request.done.wait()
+        return request
+
+    def get_batch(self):
+        """
+        Waits for the next batch of requests
+
+        :return: Requests of the batch, or None once the server is stopped
+        :rtype: list
+        """
+        request = self.requests.get()
+        if request is None:
+            return None
+        batch = [request]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Stops after this batch
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def run_batches(self):
+        """
+        Predicts the batches of requests, until the server is stopped
+
+        """
+        while True:
+            batch = self.get_batch()
+            if batch is None:
+                return
+            try:
+                self.predict_batch(batch)
+            except Exception as batch_error:
+                # Predicts the prefixes one by one, so that only the invalid ones fail. The events of running cases are
+                # not predicted again: the failed batch did not change their cases, so the clients can send them again
+                for request in batch:
+                    if request.case_id is not None:
+                        request.set_result(error=type(batch_error).__name__ + ": " + str(batch_error))
+                        continue
+                    try:
+                        self.predict_batch([request])
+                    except Exception as error:
+                        request.set_result(error=type(error).__name__ + ": " + str(error))
+            with self.metrics_lock:
+                self.request_counter += len(batch)
+                self.batch_counter += 1
+                self.batch_size_histogram[len(batch)] += 1
+
+    def predict_batch(self, batch):
+        """
+        Predicts the next activity of all the requests of a batch, with a single run of the neural network for the
+        prefixes, and another one for the events of running cases. The running cases are only updated once the whole
+        batch is predicted: if the batch fails, none of them is changed
+
+        :param batch: Requests to predict
+        :type batch: list
+        """
+        prefix_requests = [request for request in batch if request.case_id is None]
+        event_requests = [request for request in batch if request.case_id is not None]
+        probabilities = np.zeros((len(batch), self.orchestrator.activity_counter), dtype=np.float32)
+        case_states = None
+        if prefix_requests:
+            probabilities[:len(prefix_requests)] = self.predict_prefixes([request.events
+                                                                          for request in prefix_requests])
+        if event_requests:
+            probabilities[len(prefix_requests):], case_states = self.streaming_predictor.predict_events(
+                [request.case_id for request in event_requests], [request.events[0] for request in event_requests])
+        activities = self.decoder.encode_list(probabilities)
+        results = [{"activity": str(activities[i]), "probability": float(probabilities[i].max())}
+                   for i in range(len(batch))]
+        if case_states is not None:
+            self.streaming_predictor.update_cases(case_states)
+        for request, result in zip(prefix_requests + event_requests, results):
+            request.set_result(result)
+
+    def predict_prefixes(self, prefixes):
+        """
+        Edits, encodes and pads prefixes, and returns the probabilities of their next activities
+
+        :param prefixes: Prefixes, each one being a list of raw events
+        :type prefixes: list
+        :return: Probability of every activity, one row per prefix
+        :rtype: np.ndarray
+        """
+        batch = CaseBatch.from_cases([np.asarray(prefix, dtype=object) for prefix in prefixes])
+        batch = self.streaming_predictor.start_editor_manager.edit_batch(batch, self.orchestrator)
+        encoded_events = self.orchestrator.encoder_manager.encode_batch(batch.columns, batch.offsets)
+        # Padded to the smallest bucket of the preparator holding the longest prefix (longer prefixes keep their last
+        # events), as the length of the inputs of the model can vary from one bucket to another
+        padded_lengths = self.trainer.preparator.padded_lengths
+        bucket_id = min(int(self.trainer.preparator.get_bucket_ids(batch.get_lengths().max())), len(padded_lengths) - 1)
+        sequence_length = int(padded_lengths[bucket_id])
+        batch_builder = BatchBuilder(len(prefixes), sequence_length, self.orchestrator.features_counter,
+                                     self.orchestrator.activity_counter, buffer_counter=1)
+        batch_builder.add(encoded_events, batch.get_first_rows(), batch.offsets[1:],
+                          np.zeros(len(prefixes), dtype=np.int64))
+        outputs = np.asarray(self.trainer.model.predict_on_batch(batch_builder.get_batch()[0]))
+        if self.trainer.return_sequences:
+            # Output after the last event of each prefix
+            outputs = outputs[np.arange(len(prefixes)), np.minimum(batch.get_lengths(), sequence_length) - 1]
+        return outputs
+
+    def get_metrics(self):
+        """
+        Returns the number of queued requests, and the number and sizes of the predicted batches
+
+        :return: Metrics of the server
+        :rtype: dict
+        """
+        with self.metrics_lock:
+            sizes = np.flatnonzero(self.batch_size_histogram)
+            return {"queue_depth": self.requests.qsize(),
+                    "request_counter": self.request_counter,
+                    "batch_counter": self.batch_counter,
+                    "mean_batch_size": self.request_counter / self.batch_counter if self.batch_counter else 0,
+                    "batch_size_histogram": {str(size): int(self.batch_size_histogram[size]) for size in sizes},
+                    "running_case_counter": self.streaming_predictor.get_case_counter()}
+
+    def serve(self, host="localhost", port=8000):
+        """
+        Starts the server, until shutdown is called
+
+        :param host: Address of the server
+        :type host: str
+        :param port: Port of the server
+        :type port: int
+        """
+        worker = threading.Thread(target=self.run_batches, daemon=True)
+        worker.start()
+        self.http_server = PredictionHTTPServer((host, port), PredictionRequestHandler)
+        self.http_server.prediction_server = self
+        self.ready.set()
+        print("Prediction server listening on http://" + host + ":" + str(self.http_server.server_port))
+        try:
+            self.http_server.serve_forever()
+        finally:
+            self.http_server.server_close()
+            self.requests.put(None)
+            worker.join()
+
+    def shutdown(self):
+        """
+        Stops the server, from another thread
+
+        """
+        self.ready.wait()
+        self.http_server.shutdown()
@@ -0,0 +1,264 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+from tensorflow.keras.models import Model
+
+from case_batch import CaseBatch
+from Managers.editor_manager import EditorManager
+from Trainers.lstm import Mask
+
+
+class CaseState:
+
+    def __init__(self, last_event, states, last_time) -> None:
+        """
+        State of a running case, kept between two of its events
+
+        :param last_event: Last raw event of the case, used by the encoders needing the previous event (such as the
+        previous date for time differences)
+        :type last_event: np.ndarray
+        :param states: Hidden and carry states of every LSTM layer after the last event
+        :type states: list
+        :param last_time: Time of the last event received (in seconds, from time.monotonic)
+        :type last_time: float
+        """
+        self.last_event = last_event
+        self.states = states
+        self.last_time = last_time
+
+
+class StreamingPredictor:
+
+    def __init__(self, trainer, max_cases=10000, idle_time=None) -> None:
+        """
+        Predicts the next activity of running cases, one event at a time. Instead of encoding and running the whole
+        prefix of a case through the neural network after each new event, the states of its LSTM layers and its last
+        raw event are kept: a new event is encoded with its previous one, and runs a single time step of the network.
+        The cost of an event does not depend on the length of its case.
+
+        The cases are kept from the least to the most recently updated: the least recently updated ones are forgotten
+        once there are more than max_cases cases, or once they have not been updated for more than idle_time seconds
+
+        :param trainer: Trainer whose model was trained or loaded, and whose preparator was built with the orchestrator
+        of the data
+        :type trainer: LSTMTrainer
+        :param max_cases: Maximum number of running cases kept
+        :type max_cases: int
+        :param idle_time: Number of seconds after which a case that received no event is forgotten. By default, cases
+        are only forgotten to respect max_cases
+        :type idle_time: float
+        """
+        self.preparator = trainer.preparator
+        self.orchestrator = trainer.preparator.orchestrator
+        self.max_cases = max_cases
+        self.idle_time = idle_time
+        self.cases = OrderedDict()
+        # The editors adding events at the end of the cases cannot be applied to running cases
+        editors = self.orchestrator.editor_manager.editors if self.orchestrator.editor_manager else []
+        self.start_editor_manager = EditorManager([editor for editor in editors if not editor.edits_end])
+        self.step_model, self.state_shapes = self.build_step_model(trainer.model)
+        # The time step is compiled once into a graph, for any number of cases
+        signature = [tf.TensorSpec(shape=(None, 1, self.orchestrator.features_counter), dtype=tf.float32)]
+        signature += [tf.TensorSpec(shape=(None,) + shape, dtype=tf.float32) for shape in self.state_shapes]
+        self.step_function = tf.function(lambda *tensors: self.step_model(list(tensors), training=False),
+                                         input_signature=signature)
+
+    def build_step_model(self, model):
+        """
+        Builds a neural network running a single time step of a trained model: it takes the encoded events and the
+        states of the LSTM layers, and returns the probabilities of the next activities and the new states. The layers
+        of the trained model are reused (or copied, for the LSTM layers), with their weights
+
+        :param model: Trained model
+        :type model: Model
+        :return: Single step model, and the shapes of its states
+        :rtype: (Model, list)
+        """
+        step_input = layers.Input(shape=(1, self.orchestrator.features_counter), name='step_input', dtype='float32')
+        tensor = step_input
+        mask = None
+        state_inputs = []
+        state_outputs = []
+        for layer in model.layers:
+            if isinstance(layer, layers.InputLayer):
+                continue
+            if isinstance(layer, Mask):
+                mask = layer(step_input)
+            elif isinstance(layer, layers.LSTM):
+                # Same layer, that takes and returns its states
+                config = layer.get_config()
+                config.update({"name": layer.name + "_step", "return_state": True})
+                step_layer = layers.LSTM.from_config(config)
+                states = [layers.Input(shape=(layer.units,), dtype='float32') for _ in range(2)]
+                tensor, hidden_state, carry_state = step_layer(tensor, mask=mask, initial_state=states)
+                step_layer.set_weights(layer.get_weights())
+                state_inputs += states
+                state_outputs += [hidden_state, carry_state]
+            else:
+                tensor = layer(tensor)
+        output = layers.Reshape((self.orchestrator.activity_counter,))(tensor)
+        step_model = Model(inputs=[step_input] + state_inputs, outputs=[output] + state_outputs)
+        return step_model, [tuple(state.shape[1:]) for state in state_inputs]
+
+    def get_case_counter(self):
+        """
+        Returns the number of running cases currently kept
+
+        :return: Number of cases
+        :rtype: int
+        """
+        return len(self.cases)
+
+    def end_case(self, case_id):
+        """
+        Forgets a case, for example once it is complete
+
+        :param case_id: ID of the case
+        :type case_id: Any
+        """
+        self.cases.pop(case_id, None)
+
+    def evict_cases(self, now):
+        """
+        Forgets the least recently updated cases, if they are idle or if there are too many cases
+
+        :param now: Current time (in seconds, from time.monotonic)
+        :type now: float
+        """
+        while self.cases:
+            case_id, case_state = next(iter(self.cases.items()))
+            if len(self.cases) <= self.max_cases and (self.idle_time is None or
+                                                      now - case_state.last_time <= self.idle_time):
+                break
+            del self.cases[case_id]
+
+    def advance(self, case_id, event):
+        """
+        Adds a new event to a running case (that is created by its first event), and returns the probabilities of its
+        next activity
+
+        :param case_id: ID of the case
+        :type case_id: Any
+        :param event: Raw event, with the values of all the columns of the input file
+        :type event: list
+        :return: Probability of every activity
+        :rtype: np.ndarray
+        """
+        return self.advance_batch([case_id], [event])[0]
+
+    def advance_batch(self, case_ids, events):
+        """
+        Adds new events to running cases, and returns the probabilities of the next activity after each event. The
+        events of the different cases run through the neural network together; the events of a same case are added in
+        their order
+
+        :param case_ids: ID of the case of every event
+        :type case_ids: list
+        :param events: Raw events, with the values of all the columns of the input file
+        :type events: list
+        :return: Probability of every activity, one row per event
+        :rtype: np.ndarray
+        """
+        probabilities, case_states = self.predict_events(case_ids, events)
+        self.update_cases(case_states)
+        return probabilities
+
+    def predict_events(self, case_ids, events):
+        """
+        Computes the probabilities of the next activity after new events of running cases, and the new states of these
+        cases, without saving them: if an event fails, no case is changed, and the events can be sent again
+
+        :param case_ids: ID of the case of every event
+        :type case_ids: list
+        :param events: Raw events, with the values of all the columns of the input file
+        :type events: list
+        :return: Probability of every activity (one row per event), and the new state of every case, to be saved with
+        update_cases
+        :rtype: (np.ndarray, OrderedDict)
+        """
+        now = time.monotonic()
+        self.evict_cases(now)
+        probabilities = np.zeros((len(events), self.orchestrator.activity_counter), dtype=np.float32)
+        # The n-th event of a case inside the input is added during the n-th round, with the n-th events of other cases
+        rounds = []
+        occurrences = {}
+        for i, case_id in enumerate(case_ids):
+            occurrence = occurrences.get(case_id, 0)
+            occurrences[case_id] = occurrence + 1
+            if occurrence == len(rounds):
+                rounds.append([])
+            rounds[occurrence].append(i)
+        case_states = OrderedDict()
+        for positions in rounds:
+            probabilities[positions] = self.advance_cases([case_ids[i] for i in positions],
+                                                          [events[i] for i in positions], now, case_states)
+        return probabilities, case_states
+
+    def update_cases(self, case_states):
+        """
+        Saves the new states of running cases, computed by predict_events
+
+        :param case_states: New state of every case
+        :type case_states: OrderedDict
+        """
+        for case_id, case_state in case_states.items():
+            self.cases[case_id] = case_state
+            self.cases.move_to_end(case_id)
+        self.evict_cases(time.monotonic())
+
+    def advance_cases(self, case_ids, events, now, case_states):
+        """
+        Adds one new event to each of several different cases, and returns the probabilities of their next activities.
+        The new states of the cases are written into case_states, which is read before the saved cases
+
+        :param case_ids: IDs of the cases (without duplicates)
+        :type case_ids: list
+        :param events: Raw events, one per case
+        :type events: list
+        :param now: Current time (in seconds, from time.monotonic)
+        :type now: float
+        :param case_states: New states of the cases already advanced during the previous rounds
+        :type case_states: OrderedDict
+        :return: Probability of every activity, one row per case
+        :rtype: np.ndarray
+        """
+        # A new event is encoded with the previous event of its case. A new case is edited first (for example to add
+        # its "Start of State" event), and all its events run through the neural network
+        cases = []
+        previous_states = []
+        for case_id, event in zip(case_ids, events):
+            event = np.asarray(event, dtype=object).reshape(1, -1)
+            case_state = case_states[case_id] if case_id in case_states else self.cases.get(case_id)
+            if case_state is None:
+                cases.append(self.start_editor_manager.edit_case(event, self.orchestrator))
+            else:
+                cases.append(np.vstack((case_state.last_event, event)))
+            previous_states.append(case_state)
+        batch = CaseBatch.from_cases(cases)
+        encoded_events = self.orchestrator.encoder_manager.encode_batch(batch.columns, batch.offsets)
+        firsts = batch.get_first_rows() + np.asarray([case_state is not None for case_state in previous_states])
+        lasts = batch.get_last_rows()
+        states = [np.stack([np.zeros(shape, dtype=np.float32) if case_state is None else case_state.states[i]
+                            for case_state in previous_states]) for i, shape in enumerate(self.state_shapes)]
+        probabilities = np.zeros((len(cases), self.orchestrator.activity_counter), dtype=np.float32)
+        # Every case has at least one event to run, the new cases can have more
+        for step in range(int(np.max(lasts - firsts)) + 1):
+            active = np.flatnonzero(firsts + step <= lasts)
+            inputs = encoded_events[firsts[active] + step].astype(np.float32).reshape(len(active), 1, -1)
+            outputs = self.step_function(inputs, *[state[active] for state in states])
+            probabilities[active] = np.asarray(outputs[0])
+            for state, new_state in zip(states, outputs[1:]):
+                state[active] = np.asarray(new_state)
+        for i, case_id in enumerate(case_ids):
+            case_states[case_id] = CaseState(cases[i][-1:], [state[i] for state in states], now)
+        return probabilities
@@ -7,7 +7,6 @@ Licence: AGPL v3
 
 from __future__ import print_function, division
 import tensorflow as tf
-from math import ceil
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.models import Model
@@ -22,7 +21,43 @@ class Mask(keras.layers.Layer):
         return tf.experimental.numpy.any(tf.not_equal(inputs, 0), axis=2)
 
 
+class OneHotExpansion(keras.layers.Layer):
+    def __init__(self, index_columns, features_counter, **kwargs):
+        """
+        Expands the columns storing indexes of qualitative values (0 being padding) into "one-hot" vectors, inside the
+        neural network. The other columns are kept as they are
+
+        :param index_columns: List of (index of the column, number of values)
+        :type index_columns: list
+        :param features_counter: Number of columns of the input
+        :type features_counter: int
+        """
+        super().__init__(**kwargs)
+        self.index_columns = [tuple(index_column) for index_column in index_columns]
+        self.features_counter = features_counter
+
+    def call(self, inputs):
+        depths = dict(self.index_columns)
+        columns = []
+        for column_id in range(self.features_counter):
+            column = inputs[:, :, column_id]
+            if column_id in depths:
+                columns.append(tf.one_hot(tf.cast(column, tf.int32) - 1, depths[column_id], dtype=inputs.dtype))
+            else:
+                columns.append(tf.expand_dims(column, axis=2))
+        return tf.concat(columns, axis=2)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"index_columns": self.index_columns, "features_counter": self.features_counter})
+        return config
+
+
 class LSTMTrainer(Trainer):
+    # Defines if the activity is predicted after every event of the input ("many-to-many"), or only after the last one
+    return_sequences = False
+    model_name = "LSTM_model"
+
     def build(self, preparator, epoch_counter):
         super().build(preparator, epoch_counter)
 
@@ -32,14 +67,21 @@ class LSTMTrainer(Trainer):
         print('Build model...')
 
         main_input = layers.Input(
-            shape=(self.preparator.orchestrator.max_case_length-1, self.preparator.orchestrator.features_counter),
+            shape=(self.preparator.get_sequence_length(), self.preparator.orchestrator.features_counter),
             name='main_input', dtype='float32')
         mask = Mask()(main_input)
+        # Columns of indexes are expanded into "one-hot" vectors only here
+        index_columns = self.preparator.get_index_columns()
+        if index_columns:
+            lstm_input = OneHotExpansion(index_columns, self.preparator.orchestrator.features_counter)(main_input)
+        else:
+            lstm_input = main_input
         # train a 2-layer LSTM with one shared layer
         l1 = layers.LSTM(100, implementation=2, kernel_initializer='glorot_uniform', return_sequences=True, dropout=0.2)(
-            main_input, mask=mask)  # the shared layer
+            lstm_input, mask=mask)  # the shared layer
         b1 = layers.BatchNormalization()(l1)
-        l2_1 = layers.LSTM(100, implementation=2, kernel_initializer='glorot_uniform', return_sequences=False, dropout=0.2)(
+        l2_1 = layers.LSTM(100, implementation=2, kernel_initializer='glorot_uniform',
+                           return_sequences=self.return_sequences, dropout=0.2)(
             b1)  # the layer specialized in activity prediction
         b2_1 = layers.BatchNormalization()(l2_1)
         act_output = layers.Dense(self.preparator.orchestrator.activity_counter, activation='softmax',
@@ -59,29 +101,56 @@ class LSTMTrainer(Trainer):
                                        min_delta=0.0001, cooldown=0, min_lr=0)
         return model, [early_stopping, model_checkpoint, lr_reducer]
 
+    def get_dataset(self, generator_function, value):
+        """
+        Wraps a generator of batches of the preparator into a dataset, whose batches may have different lengths (if the
+        prefixes are grouped by buckets). The next batches are prepared while the neural network trains
+
+        :param generator_function: Generator function of the preparator (run_online or read_offline)
+        :type generator_function: function
+        :param value: Set of the prefixes (0 for Train, 1 for Validation, 2 for Test)
+        :type value: int
+        :return: Dataset of the batches
+        :rtype: tf.data.Dataset
+        """
+        return tf.data.Dataset.from_generator(lambda: generator_function(value),
+                                              output_signature=self.preparator.get_output_signature()
+                                              ).prefetch(tf.data.AUTOTUNE)
+
     def train_model_online(self):
         model, callbacks = self.core()
-        epoch_size_train = self.preparator.get_epoch_size_online(0)
-        epoch_size_val = self.preparator.get_epoch_size_online(1)
-        model.fit(self.preparator.run_online(0), verbose=2, validation_data=self.preparator.run_online(1), callbacks=callbacks,
-                  steps_per_epoch=ceil(epoch_size_train / self.preparator.batch_size), epochs=self.epoch_counter,
-                  validation_steps=ceil(epoch_size_val / self.preparator.batch_size))
+        # With buckets, an epoch has more batches than prefixes divided by the size of a batch
+        steps_train = self.preparator.get_step_counter_online(0)
+        steps_val = self.preparator.get_step_counter_online(1)
+        model.fit(self.get_dataset(self.preparator.run_online, 0), verbose=2,
+                  validation_data=self.get_dataset(self.preparator.run_online, 1), callbacks=callbacks,
+                  steps_per_epoch=steps_train, epochs=self.epoch_counter, validation_steps=steps_val)
         self.model = model
         return model
 
     def train_model_offline(self):
         model, callbacks = self.core()
-        epoch_size_train = self.preparator.get_epoch_size_offline(0)
-        epoch_size_val = self.preparator.get_epoch_size_offline(1)
-        model.fit(self.preparator.read_offline(0), verbose=1, validation_data=self.preparator.read_offline(1), callbacks=callbacks,
-                  steps_per_epoch=ceil(epoch_size_train / self.preparator.batch_size), epochs=self.epoch_counter,
-                  validation_steps=ceil(epoch_size_val / self.preparator.batch_size))
+        steps_train = self.preparator.get_step_counter_offline(0)
+        steps_val = self.preparator.get_step_counter_offline(1)
+        # The batches are built from the encoded cases by several threads
+        model.fit(self.preparator.get_dataset_offline(0), verbose=1,
+                  validation_data=self.preparator.get_dataset_offline(1), callbacks=callbacks,
+                  steps_per_epoch=steps_train, epochs=self.epoch_counter, validation_steps=steps_val)
         self.model = model
         return model
 
     def load_model(self):
-        model = keras.models.load_model("Output/" + self.preparator.orchestrator.output_name + '/Models/LSTM_model')
+        model = keras.models.load_model("Output/" + self.preparator.orchestrator.output_name + '/Models/' +
+                                        self.model_name,
+                                        custom_objects={"Mask": Mask, "OneHotExpansion": OneHotExpansion})
         self.model = model
 
     def save_model(self):
-        self.model.save("Output/" + self.preparator.orchestrator.output_name + '/Models/LSTM_model')
+        self.model.save("Output/" + self.preparator.orchestrator.output_name + '/Models/' + self.model_name)
+
+
+class LSTMSequenceTrainer(LSTMTrainer):
+    # Trains on whole cases (see NextActivitySequence): the activity is predicted after every event, and the padding is
+    # ignored thanks to the weights of the time steps given by the preparator
+    return_sequences = True
+    model_name = "LSTM_sequence_model"
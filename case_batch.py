@@ -0,0 +1,166 @@
+"""
+Deep Learning Framework
+Version 1.5
+Authors: Benoit Vuillemin, Frederic Bertrand
+Licence: AGPL v3
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def as_object_column(column):
+    """
+    Converts a typed column into an array of Python objects, as if it was extracted from a mixed-type dataframe (dates
+    become Timestamps)
+
+    :param column: Column to convert
+    :type column: np.ndarray
+    :return: Column of objects
+    :rtype: np.ndarray
+    """
+    if column.dtype == object:
+        return column
+    if np.issubdtype(column.dtype, np.datetime64):
+        return pd.Series(column).astype(object).to_numpy()
+    return column.astype(object)
+
+
+class CaseBatch:
+
+    def __init__(self, columns, offsets) -> None:
+        """
+        Batch of cases stored as a structure of arrays: one typed array per column, holding the events of all the cases
+        one after the other, and an array of offsets: the events of the case i are the rows offsets[i] to
+        offsets[i + 1] - 1
+
+        :param columns: Values of each column
+        :type columns: list
+        :param offsets: First row of each case, followed by the total number of rows
+        :type offsets: np.ndarray
+        """
+        self.columns = columns
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @staticmethod
+    def from_dataframe(chunk, case_starts):
+        """
+        Creates a batch from a chunk of complete cases
+
+        :param chunk: Chunk of data
+        :type chunk: pd.DataFrame
+        :param case_starts: Index of the first row of every case
+        :type case_starts: np.ndarray
+        :return: Batch of the cases of the chunk
+        :rtype: CaseBatch
+        """
+        columns = [chunk[column_name].to_numpy() for column_name in chunk.columns]
+        return CaseBatch(columns, np.append(case_starts, len(chunk)))
+
+    @staticmethod
+    def from_cases(cases):
+        """
+        Creates a batch from a list of cases
+
+        :param cases: Cases, each one being an array with one row per event
+        :type cases: list
+        :return: Batch of the cases
+        :rtype: CaseBatch
+        """
+        offsets = np.cumsum([0] + [len(case) for case in cases])
+        if len(cases) == 1:
+            columns = [cases[0][:, i] for i in range(cases[0].shape[1])]
+        else:
+            columns = [np.concatenate([case[:, i] for case in cases]) for i in range(cases[0].shape[1])]
+        return CaseBatch(columns, offsets)
+
+    def get_case_counter(self):
+        """
+        Returns the number of cases inside the batch
+
+        :return: Number of cases
+        :rtype: int
+        """
+        return len(self.offsets) - 1
+
+    def get_lengths(self):
+        """
+        Returns the number of events of each case
+
+        :return: Length of every case
+        :rtype: np.ndarray
+        """
+        return np.diff(self.offsets)
+
+    def get_first_rows(self):
+        """
+        Returns the index of the first event of each case
+
+        :return: Index of the first row of every case
+        :rtype: np.ndarray
+        """
+        return self.offsets[:-1]
+
+    def get_last_rows(self):
+        """
+        Returns the index of the last event of each case
+
+        :return: Index of the last row of every case
+        :rtype: np.ndarray
+        """
+        return self.offsets[1:] - 1
+
+    def to_numpy(self):
+        """
+        Converts all the events of the batch into a single array of Python objects
+
+        :return: One row per event
+        :rtype: np.ndarray
+        """
+        result = np.empty((self.offsets[-1], len(self.columns)), dtype=object)
+        for i, column in enumerate(self.columns):
+            result[:, i] = as_object_column(column)
+        return result
+
+    def get_cases(self):
+        """
+        Returns all the cases of the batch, as arrays of Python objects (same as the old representation of a case)
+
+        :return: List of cases
+        :rtype: list
+        """
+        if self.get_case_counter() == 0:
+            return []
+        return np.split(self.to_numpy(), self.offsets[1:-1])
+
+    def get_case(self, index):
+        """
+        Returns a single case of the batch, as an array of Python objects
+
+        :param index: Index of the case
+        :type index: int
+        :return: Case
+        :rtype: np.ndarray
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return CaseBatch([column[start:end] for column in self.columns], [0, end - start]).to_numpy()
+
+    def insert_rows(self, positions, values):
+        """
+        Inserts one new event inside every case
+
+        :param positions: Index of the row before which the new event of each case is inserted (inside the whole batch)
+        :type positions: np.ndarray
+        :param values: Values of the new events, one scalar or array for each column
+        :type values: list
+        :return: New batch, with one more event per case
+        :rtype: CaseBatch
+        """
+        columns = []
+        for column, value in zip(self.columns, values):
+            value_dtype = np.asarray(value).dtype
+            if column.dtype != object and not np.can_cast(value_dtype, column.dtype, casting='same_kind'):
+                column = as_object_column(column)
+            columns.append(np.insert(column, positions, value))
+        offsets = self.offsets + np.arange(len(self.offsets))
+        return CaseBatch(columns, offsets)
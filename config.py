@@ -29,7 +29,7 @@ double_timestamps = False
 # Indexes of the columns where there are dates in the input file
 dates_ids = [2]
 
-# The mode can be online, offline or edit_db
+# The mode can be online, offline, edit_db or serve
 mode = "offline"
 
 # The steps for offline mode can be all, encode, decode, prepare, train
@@ -30,17 +30,26 @@ epoch_counter = 5
 double_timestamps = False
 # Indexes of the columns where there are dates in the input file
 dates_ids = [2]
+# States if the parsed input file is stored inside a binary columnar cache (in the "Cache" folder), read by all the
+# following steps instead of the CSV file. The cache is rebuilt when the input file changes
+use_cache = False
+# Number of processes working at the same time on the chunks of the input file (1 to use a single process)
+workers = 1
 
 # States if the co-variables must be considered or not
 consider_cov = False
 # States if encoders must be automatically created according to the data types stored inside columns.
 # Works only for co-variable columns, not the core columns (case id, activity, start timestamp (or end timestamp))
 auto_build_cov_encoders = True
+# States if the automatically created encoders store qualitative co-variables as indexes (one int32 column) instead of
+# "one-hot" vectors. Useful for columns with many values: the "one-hot" vectors are only built by the neural network
+cov_one_hot_index = False
 
 # Set it to true if you want to load a previously made orchestrator
 orchestrator_from_file = False
 
-# The mode can be online, offline or edit_db
+# The mode can be online, offline, edit_db or serve (local server predicting the next activity with a saved
+# orchestrator and model)
 mode = "offline"
 
 # The steps for offline mode can be all, encode, decode, prepare, train
@@ -48,13 +57,23 @@ offline_steps = ["all"]
 # Get a debug file from the encoding (human-readable csv file)
 debug = False
 
+# Address and port of the prediction server (serve mode)
+server_host = "localhost"
+server_port = 8000
+# Maximum number of requests predicted together by the server, and maximum time (in seconds) waited for the following
+# requests of a batch
+server_max_batch_size = 64
+server_max_wait = 0.005
+
 # List of encoders
 encoders = [DeleteEncoder(0), OneHotEncoder(1, activity=True), TimeDifferenceSingleEncoder(2)]
 # List of co-variables encoders
 cov_encoders = []
 # List of editors
 editors = [SosForAll(), EosForAll()]
-# Data preparator
+# Data preparator. Prefixes can be grouped by length, each batch being padded only to the bound of its bucket, with
+# NextActivity(bucket_bounds=[...]). With NextActivity(deduplicate=True), identical (prefix, next activity) pairs are
+# read once offline, weighted by their number of occurrences
 preparator = NextActivity()
 # Trainer for the neural network
 trainer = LSTMTrainer()
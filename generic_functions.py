@@ -6,69 +6,81 @@ Licence: AGPL v3
 """
 
 import os
+from collections import deque
 from math import ceil
 
 import numpy as np
 import pandas as pd
 
+from case_batch import CaseBatch
 from column_type import ColumnType
 
 
-def get_complete_cases(chunk, id_column, first_chunk, last_chunk, previous_case, previous_case_id):
+def get_case_starts(case_ids):
     """
-    Converts the raw chunk into complete cases
+    Finds the first row of every case inside a column of case IDs, where all the events of a case follow each other.
+    A new case starts wherever the ID changes
+
+    :param case_ids: Column of case IDs
+    :type case_ids: np.ndarray
+    :return: Indexes of the first row of every case
+    :rtype: np.ndarray
+    """
+    case_ids = np.asarray(case_ids)
+    if len(case_ids) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(case_ids[1:] != case_ids[:-1]) + 1))
+
+
+def get_complete_batch(chunk, id_column, last_chunk, previous_case):
+    """
+    Converts the raw chunk into a batch of complete cases. The last case of the chunk may continue inside the next
+    chunk, so its events are kept for the next call
 
     :param chunk: Chunk of data
     :type chunk: pd.DataFrame
     :param id_column: Name of the column corresponding to the case IDs
     :type id_column: str
-    :param first_chunk: Defines if it is the first chunk to be processed
-    :type first_chunk: bool
     :param last_chunk: Defines if it is the last chunk to be processed
     :type last_chunk: bool
-    :param previous_case: Last case of the previous chunk
-    :type previous_case: np.ndarray
-    :param previous_case_id: Case ID of the last case of the previous chunk
-    :type previous_case_id: str
-    :return: The complete cases of the chunk, a list of the case IDs, the last case of the chunk and its ID
-    :rtype: (list, np.ndarray, np.ndarray, int)
+    :param previous_case: Events of the last case of the previous chunk (None for the first chunk)
+    :type previous_case: pd.DataFrame
+    :return: The complete cases of the chunk and the events of its last case
+    :rtype: (CaseBatch, pd.DataFrame)
     """
-    complete_cases = []
-    case_ids = []
-    chunk_case_counter = 0
-    cases = chunk.groupby(id_column)
-    first_case = True
-    for case_id, case in cases:
-        # Check if it is the last case of the chunk
-        chunk_case_counter += 1
-        last_case = chunk_case_counter == len(cases)
-        # If it is the last case of the chunk, it may be cut in half. So, we save it for the next chunk (if there
-        # is one)
-        if last_case and not last_chunk:
-            # Only if a case is split into multiple chunks
-            if not first_chunk and first_case and previous_case[id_column] == case[id_column]:
-                previous_case = pd.concat([previous_case, case])
-            else:
-                previous_case = case
-                previous_case_id = case_id
-            continue
-        # If it is the first case of the chunk, it can be the last part of the last case of the previous chunk (
-        # if there is one). So, if it is, concatenate
-        if first_case and not first_chunk:
-            if previous_case_id == case_id:
-                complete_cases.append(pd.concat([previous_case, case]))
-            else:
-                # Else, add the previous case and the current one
-                complete_cases.append(previous_case)
-                case_ids.append(case_id)
-                complete_cases.append(case)
-            first_case = False
-        # Else, just modify the case !
-        else:
-            complete_cases.append(case)
-        # Add the case and its id to the corresponding lists
-        case_ids.append(case_id)
-    return complete_cases, np.asarray(case_ids), previous_case, previous_case_id
+    if previous_case is not None and len(previous_case) > 0:
+        chunk = pd.concat([previous_case, chunk], ignore_index=True)
+    starts = get_case_starts(chunk[id_column].to_numpy())
+    if not last_chunk and len(starts) > 0:
+        previous_case = chunk.iloc[starts[-1]:]
+        chunk = chunk.iloc[:starts[-1]]
+        starts = starts[:-1]
+    else:
+        previous_case = None
+    return CaseBatch.from_dataframe(chunk, starts), previous_case
+
+
+def split_range_cases(chunk, id_column):
+    """
+    Splits a chunk read from a range of bytes of the file on its case boundaries. Its first case may have started
+    inside the previous range, and its last case may continue inside the next range: only the cases in between are
+    known to be complete
+
+    :param chunk: Chunk of data
+    :type chunk: pd.DataFrame
+    :param id_column: Name of the column corresponding to the case IDs
+    :type id_column: str
+    :return: Events of the first case, batch of the complete cases in between, events of the last case (None if the
+    chunk has a single case)
+    :rtype: (pd.DataFrame, CaseBatch, pd.DataFrame)
+    """
+    starts = get_case_starts(chunk[id_column].to_numpy())
+    if len(starts) < 2:
+        return chunk, CaseBatch.from_dataframe(chunk.iloc[:0], starts[:0]), None
+    head = chunk.iloc[:starts[1]]
+    middle = CaseBatch.from_dataframe(chunk.iloc[starts[1]:starts[-1]], starts[1:-1] - starts[1])
+    tail = chunk.iloc[starts[-1]:]
+    return head, middle, tail
 
 
 def remove_nan(chunk):
@@ -112,15 +124,48 @@ def get_total_chunk_number(case_counter, input_chunk_size):
     return ceil(case_counter / input_chunk_size)
 
 
-def get_cases_info(chunk, cid_column_name, first_chunk, last_chunk, previous_id, previous_size, case_counter,
-                   max_case_length):
+def get_chunk_cases(case_ids):
     """
-    Updates the info (case counter, max length of a case) from a chunk of cases
+    Summarizes the cases of a chunk: IDs of its first and last cases, and number of events of every case
 
-    :param chunk: Chunk of data
-    :type chunk: pd.DataFrame
-    :param cid_column_name: Name of the column where the case ID is
-    :type cid_column_name: str
+    :param case_ids: Column of case IDs of the chunk
+    :type case_ids: np.ndarray
+    :return: First case ID, last case ID, and size of each case (the first and last cases may be incomplete)
+    :rtype: (Any, Any, np.ndarray)
+    """
+    starts = get_case_starts(case_ids)
+    sizes = np.diff(np.append(starts, len(case_ids)))
+    if len(case_ids) == 0:
+        return None, None, sizes
+    return case_ids[0], case_ids[-1], sizes
+
+
+def add_to_histogram(histogram, values):
+    """
+    Counts non-negative integers inside a histogram, that grows if needed
+
+    :param histogram: Number of occurrences of each integer (the index being the integer)
+    :type histogram: np.ndarray
+    :param values: Integers to count
+    :type values: np.ndarray
+    :return: Updated histogram
+    :rtype: np.ndarray
+    """
+    counts = np.bincount(np.asarray(values, dtype=np.int64))
+    if len(counts) > len(histogram):
+        histogram = np.append(histogram, np.zeros(len(counts) - len(histogram), dtype=np.int64))
+    histogram[:len(counts)] += counts
+    return histogram
+
+
+def merge_cases_info(chunk_cases, first_chunk, last_chunk, previous_id, previous_size, case_counter,
+                     max_case_length, length_histogram):
+    """
+    Updates the info (case counter, max length of a case, histogram of the lengths) with the summary of the cases of a
+    chunk
+
+    :param chunk_cases: Summary of the cases of the chunk, given by get_chunk_cases
+    :type chunk_cases: (Any, Any, np.ndarray)
     :param first_chunk: Defines if it is the first chunk to be processed
     :type first_chunk: bool
     :param last_chunk: Defines if it is the last chunk to be processed
@@ -133,31 +178,56 @@ def get_cases_info(chunk, cid_column_name, first_chunk, last_chunk, previous_id,
     :type case_counter: int
     :param max_case_length: Maximum length of a case
     :type max_case_length: int
-    :return: Updated ID and size of the last case, case counter and max length of a case
-    :rtype: (str, int, int, int)
+    :param length_histogram: Number of cases of each length
+    :type length_histogram: np.ndarray
+    :return: Updated ID and size of the last case, case counter, max length of a case and histogram of the lengths
+    :rtype: (str, int, int, int, np.ndarray)
     """
-    unique, counts = np.unique(chunk[cid_column_name], return_counts=True)
-    if not first_chunk:
-        index = np.where(unique == previous_id)[0]
-        if index.size == 0:
-            case_counter += 1
-            max_case_length = max(max_case_length, previous_size)
-        else:
-            counts[index] += previous_size
-    if not last_chunk:
-        if previous_id == np.asarray(chunk[cid_column_name])[-1]:
-            index = np.where(unique == previous_id)[0]
-            previous_size += counts[index]
+    first_id, last_id, sizes = chunk_cases
+    # The first case of the chunk can be the end of the last case of the previous chunk. Else, the last case of the
+    # previous chunk is complete
+    if not first_chunk and previous_id is not None:
+        if len(sizes) > 0 and first_id == previous_id:
+            sizes = sizes.copy()
+            sizes[0] += previous_size
         else:
-            previous_id = np.asarray(chunk[cid_column_name])[-1]
-            index = np.where(unique == previous_id)[0]
-            previous_size = counts[index]
-            unique = np.delete(unique, index)
-            counts = np.delete(counts, index)
-    case_counter += unique.size
-    if len(counts) > 0:
-        max_case_length = max(max_case_length, max(counts))
-    return previous_id, previous_size, case_counter, max_case_length
+            sizes = np.append(previous_size, sizes)
+    # The last case of the chunk may continue inside the next chunk
+    if not last_chunk and len(sizes) > 0:
+        previous_id = last_id if last_id is not None else previous_id
+        previous_size = int(sizes[-1])
+        sizes = sizes[:-1]
+    case_counter += len(sizes)
+    if len(sizes) > 0:
+        max_case_length = max(max_case_length, int(sizes.max()))
+        length_histogram = add_to_histogram(length_histogram, sizes)
+    return previous_id, previous_size, case_counter, max_case_length, length_histogram
+
+
+def map_in_order(executor, function, arguments, window_size):
+    """
+    Runs a function on every element with an executor (such as a process pool), and returns the results in the order
+    of the elements. At most window_size elements are processed (or waiting) at once, so that the elements are not all
+    loaded in memory
+
+    :param executor: Executor running the function
+    :type executor: concurrent.futures.Executor
+    :param function: Function to run
+    :type function: Callable
+    :param arguments: Iterable of the arguments of every call of the function (one tuple per call)
+    :type arguments: Iterable
+    :param window_size: Maximum number of pending calls
+    :type window_size: int
+    :return: Generator of the results
+    :rtype: Generator
+    """
+    futures = deque()
+    for argument in arguments:
+        futures.append(executor.submit(function, *argument))
+        if len(futures) >= window_size:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
 
 
 def create_directories(output_name, sub_folder=None):
@@ -180,7 +250,7 @@ def create_directories(output_name, sub_folder=None):
             os.makedirs("Output/" + output_name + "/"+sub_folder+"/")
 
 
-def sort_cov_for_all_file(cov_path, input_chunk_size, dates=None):
+def sort_cov_for_all_file(cov_path, input_chunk_size, dates=None, chunks=None):
     """
     Sorts all columns of a file into co-variables that are either qualitative, quantitative or date
 
@@ -190,12 +260,14 @@ def sort_cov_for_all_file(cov_path, input_chunk_size, dates=None):
     :type input_chunk_size: int
     :param dates: List of columns that have timestamps
     :type dates: list
+    :param chunks: Chunks of the file already parsed (such as the chunks of its cache). By default, the file is read
+    :type chunks: Iterable
     :return: Ordered list of columns, with a column type for each index
     :rtype: list
     """
-    if dates:
+    if chunks is None and dates:
         chunks = pd.read_csv(cov_path, chunksize=input_chunk_size, parse_dates=dates)
-    else:
+    elif chunks is None:
         chunks = pd.read_csv(cov_path, chunksize=input_chunk_size)
     first_chunk = True
     cov_list = []
@@ -259,18 +331,13 @@ def merge_data_cov(cases, cov):
 
     :param cases: Cases to process
     :type cases: list
-    :param cov: Array of co-variables
+    :param cov: Array of co-variables, with one row per case (in the same order), empty if the case has no co-variables
     :type cov: np.ndarray
     :return: Updated list of cases, with the co-variables
     :rtype: list
     """
     new_data = []
-    i = 0
-    for case in cases:
-        if case[0][0] == cov[i][0]:
-            cov_matrix = np.tile(np.array(cov[i]), (case.shape[0], 1))
-            i += 1
-        else:
-            cov_matrix = np.empty([case.shape[0], len(cov[i])], dtype=object)
+    for case, cov_row in zip(cases, cov):
+        cov_matrix = np.tile(cov_row, (case.shape[0], 1))
         new_data.append(np.hstack((case, cov_matrix)))
-    return new_data, i
+    return new_data
@@ -9,10 +9,12 @@ from Managers.common_functions import *
 from defaults import *
 from config import *
 from Managers.encoder_manager import EncoderManager
+from Predictors import PredictionServer
 
 if __name__ == '__main__':
     # Create the orchestrator and the data preparator
-    if orchestrator_from_file:
+    # The prediction server always uses a saved orchestrator
+    if orchestrator_from_file or mode == "serve":
         orchestrator = load_orchestrator_from_file(output_name)
     else:
         # Concatenate data and co-variable encoders
@@ -20,12 +22,13 @@ if __name__ == '__main__':
             # Automatically generate co-variable encoders if needed
             if auto_build_cov_encoders:
                 skip = 4 if double_timestamps else 3
-                cov_encoders = auto_cov_encoders(input_path, input_chunk_size, skip)
+                cov_encoders = auto_cov_encoders(input_path, input_chunk_size, skip, use_cache,
+                                                 cov_one_hot_index, dates_ids)
             encoders += cov_encoders
         encoder_manager = EncoderManager(encoders)
         editor_manager = EditorManager(editors)
         orchestrator = build_orchestrator(input_path, output_name, input_chunk_size, encoder_manager,
-                                          editor_manager, dates_ids, double_timestamps)
+                                          editor_manager, dates_ids, double_timestamps, use_cache, workers)
         orchestrator.save_to_file()
     preparator.build(input_chunk_size, output_chunk_size, batch_size, orchestrator)
 
@@ -37,7 +40,7 @@ if __name__ == '__main__':
     # OFFLINE
     if mode == "offline":
         if "all" in offline_steps or "encode" in offline_steps:
-            orchestrator.process_offline(input_chunk_size, False, debug=debug)
+            orchestrator.process_offline(input_chunk_size, False, debug=debug, workers=workers)
         if "all" in offline_steps or "decode" in offline_steps:
             decode_offline(output_name, output_chunk_size)
         if "all" in offline_steps or "prepare" in offline_steps:
@@ -50,6 +53,13 @@ if __name__ == '__main__':
     # EDIT DATABASE
     if mode == "edit_db":
         if cov_path:
-            orchestrator.process_offline(input_chunk_size, True, cov_path)
+            orchestrator.process_offline(input_chunk_size, True, cov_path, workers=workers)
         else:
-            orchestrator.process_offline(input_chunk_size, True)
+            orchestrator.process_offline(input_chunk_size, True, workers=workers)
+
+    # PREDICTION SERVER
+    if mode == "serve":
+        trainer.build(preparator, epoch_counter)
+        trainer.load_model()
+        server = PredictionServer(trainer, server_max_batch_size, server_max_wait)
+        server.serve(server_host, server_port)